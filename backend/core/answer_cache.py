@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def unit_vector(vector):
+    vector = np.asarray(vector, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Per-document cache of answers keyed by question embedding. A question whose embedding is
+# within `threshold` cosine similarity of one already answered for the same document reuses
+# that answer instead of running retrieval and the LLM again.
+# Each document's entries carry the version (Document.updated_at) they were answered against;
+# a lookup with a different version drops them, so re-processing in another worker also invalidates.
+# Bounded per document and by number of documents, both least recently used first.
+class SemanticAnswerCache:
+    def __init__(self, threshold=0.92, max_entries_per_document=50, max_documents=500, ttl=None):
+        self.threshold = threshold
+        self.max_entries_per_document = max_entries_per_document
+        self.max_documents = max_documents
+        self.ttl = ttl  # Seconds; None keeps answers until evicted or invalidated
+        self._documents = OrderedDict()  # document_id -> {"version": ..., "entries": [entry, ...]} (LRU order)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _bucket(self, document_id, version):
+        # Caller holds the lock. Returns the document's entries, dropping them if answered against another version.
+        bucket = self._documents.get(document_id)
+        if bucket is not None and bucket["version"] != version:
+            del self._documents[document_id]
+            self.invalidations += 1
+            bucket = None
+        return bucket
+
+    def lookup(self, document_id, version, embedding):
+        """Returns (entry, similarity) for the closest cached question above the threshold, or None."""
+        query = unit_vector(embedding)
+        with self._lock:
+            bucket = self._bucket(document_id, version)
+            if bucket is not None and self.ttl is not None:
+                cutoff = time.time() - self.ttl
+                bucket["entries"] = [entry for entry in bucket["entries"] if entry["created_at"] >= cutoff]
+            if not bucket or not bucket["entries"]:
+                self.misses += 1
+                return None
+
+            entries = bucket["entries"]
+            similarities = np.stack([entry["vector"] for entry in entries]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            # Most recently used entries (and documents) are evicted last
+            entries.append(entries.pop(best))
+            self._documents.move_to_end(document_id)
+            self.hits += 1
+            return entries[-1], float(similarities[best])
+
+    def store(self, document_id, version, question, embedding, answer, highlight_indexes):
+        if self.max_entries_per_document <= 0 or self.max_documents <= 0:
+            return
+        entry = {
+            "question": question,
+            "vector": unit_vector(embedding),
+            "answer": answer,
+            "highlight_indexes": list(highlight_indexes),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            bucket = self._bucket(document_id, version)
+            if bucket is None:
+                bucket = self._documents[document_id] = {"version": version, "entries": []}
+            # A fresh answer (e.g. use_cache=false) replaces the one it would have been served from
+            bucket["entries"] = [
+                cached for cached in bucket["entries"] if float(cached["vector"] @ entry["vector"]) < self.threshold
+            ]
+            bucket["entries"].append(entry)
+            self._documents.move_to_end(document_id)
+            while len(bucket["entries"]) > self.max_entries_per_document:
+                bucket["entries"].pop(0)
+                self.evictions += 1
+            while len(self._documents) > self.max_documents:
+                _, evicted = self._documents.popitem(last=False)
+                self.evictions += len(evicted["entries"])
+
+    def invalidate(self, document_id):
+        """Drops every cached answer of a document (deleted or re-processed)."""
+        with self._lock:
+            if self._documents.pop(document_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(bucket["entries"]) for bucket in self._documents.values())
+        return {
+            "documents": len(self._documents),
+            "entries": entries,
+            "threshold": self.threshold,
+            "max_entries_per_document": self.max_entries_per_document,
+            "max_documents": self.max_documents,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,106 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+# Keeps clause numbers and rates together as single terms ("12.3", "8.5", "emi")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# Inverted index over one document's chunks.
+# Never modified once published in BM25Index, so searches can read it without the lock.
+class _DocumentPostings:
+    def __init__(self, chunks=()):
+        self.postings = {}  # term -> {chunk_index: term frequency}
+        self.lengths = {}  # chunk_index -> token count
+        self.total_length = 0
+        for chunk_index, text in chunks:
+            self._add(chunk_index, text)
+
+    def _add(self, chunk_index, text):
+        tokens = tokenize(text)
+        self.lengths[chunk_index] = len(tokens)
+        self.total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[chunk_index] = tf
+
+    def merged(self, other):
+        """A new _DocumentPostings holding both sets of chunks; neither input is modified."""
+        merged = _DocumentPostings()
+        merged.postings = dict(self.postings)
+        for term, matches in other.postings.items():
+            existing = merged.postings.get(term)
+            merged.postings[term] = {**existing, **matches} if existing else matches
+        merged.lengths = {**self.lengths, **other.lengths}
+        merged.total_length = sum(merged.lengths.values())
+        return merged
+
+
+# Per-document BM25 keyword index over DocumentChunk text.
+# Filled incrementally at ingestion time; documents evicted from the LRU (or lost
+# on restart) are rebuilt lazily from the database by the caller.
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75, max_documents=500):
+        self.k1 = k1
+        self.b = b
+        self.max_documents = max_documents
+        self._documents = OrderedDict()  # document_id -> _DocumentPostings
+        self._lock = threading.Lock()
+
+    def __contains__(self, document_id):
+        return document_id in self._documents
+
+    def add_chunks(self, document_id, chunks):
+        """
+        Adds (chunk_index, text) pairs to a document's inverted index. The postings are built
+        outside the lock (chunks may be a database iterator) and published in one assignment,
+        so a search never sees a half-built index.
+        """
+        built = _DocumentPostings(chunks)
+        with self._lock:
+            postings = self._documents.get(document_id)
+            self._documents[document_id] = postings.merged(built) if postings is not None else built
+            self._documents.move_to_end(document_id)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def remove(self, document_id):
+        with self._lock:
+            self._documents.pop(document_id, None)
+
+    def search(self, document_id, query, k):
+        """Returns up to k (chunk_index, score) pairs for a document, best first."""
+        with self._lock:
+            postings = self._documents.get(document_id)  # A published snapshot; scored without the lock
+        if postings is None or not postings.lengths:
+            return []
+
+        n = len(postings.lengths)
+        avg_length = postings.total_length / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            matches = postings.postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (n - len(matches) + 0.5) / (len(matches) + 0.5))
+            for chunk_index, tf in matches.items():
+                norm = self.k1 * (1 - self.b + self.b * postings.lengths[chunk_index] / avg_length)
+                scores[chunk_index] = scores.get(chunk_index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several ranked lists of ids with RRF: score(id) = sum of 1 / (k + rank).
+    Rank-based, so BM25 scores and L2 distances need no calibration against each other.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
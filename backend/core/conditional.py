@@ -0,0 +1,33 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+# ETag / Last-Modified for list endpoints.
+# get_list_version() returns (last_modified datetime or None, version string) from one cheap
+# query; a client revalidating an unchanged listing gets 304 before anything is serialized.
+# The version covers what updated_at cannot, such as deleted rows.
+class ConditionalListMixin:
+    def get_list_version(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        last_modified, version = self.get_list_version()
+        timestamp = last_modified.timestamp() if last_modified else None
+        # Pages and projections of the same listing are different representations
+        etag = quote_etag(hashlib.sha1(f"{version}|{timestamp}|{request.get_full_path()}".encode('utf-8')).hexdigest())
+
+        # Last-Modified only carries whole seconds, so If-Modified-Since is compared against those too
+        last_modified_seconds = int(timestamp) if timestamp is not None else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_seconds)
+        if not_modified is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            response = not_modified
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(last_modified_seconds)
+        patch_cache_control(response, private=True, no_cache=True)  # Browsers revalidate on every navigation
+        return response
@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import threading
+
+import faiss
+import numpy as np
+
+from .file_lock import file_lock
+from .models import Document, DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+
+# Corpus-wide approximate nearest-neighbour index (HNSW) over every processed
+# document's chunk vectors, keyed by DocumentChunk.pk.
+# HNSW cannot delete, so vectors of deleted or re-processed documents stay in the
+# graph until the next rebuild; their chunk rows are gone, so search drops them.
+#
+# Persistence is a snapshot (the graph + a JSON meta file) plus an append-only journal of
+# the documents added/removed since. Every worker appends its changes to the journal under
+# a file lock and replays the other workers' entries incrementally; the graph is only
+# rewritten once save_every changes have piled up, so an upload does not cost O(corpus).
+class CorpusIndex:
+    def __init__(self, vector_store, path, m=32, ef_construction=80, ef_search=64, save_every=50):
+        self.vector_store = vector_store
+        self.path = str(path)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.save_every = save_every  # Journal entries before the graph is rewritten
+        self._index = None
+        self._documents = {}  # Document id -> [vector count, first chunk id] of its vectors in the graph
+        self._stale = 0  # Vectors belonging to deleted or re-processed documents
+        self._loaded_mtime = None  # mtime (ns) of the snapshot meta file this process loaded
+        self._journal_offset = 0  # Bytes of the journal applied to the in-memory graph
+        self._journal_entries = 0  # Journal entries not yet in the snapshot
+        self._lock = threading.RLock()  # In-memory graph; taken after the file lock when both are needed
+
+    def _meta_path(self):
+        return self.path + ".json"
+
+    def _journal_path(self):
+        return self.path + ".journal"
+
+    def _file_lock(self):
+        return file_lock(self.path + ".lock")
+
+    def _new_index(self):
+        hnsw = faiss.IndexHNSWFlat(self.vector_store.dim, self.m)
+        hnsw.hnsw.efConstruction = self.ef_construction
+        hnsw.hnsw.efSearch = self.ef_search
+        return faiss.IndexIDMap2(hnsw)
+
+    def _disk_state(self):
+        try:
+            mtime = os.stat(self._meta_path()).st_mtime_ns
+        except OSError:
+            mtime = None
+        try:
+            journal_size = os.path.getsize(self._journal_path())
+        except OSError:
+            journal_size = 0
+        return mtime, journal_size
+
+    def _is_current(self):
+        mtime, journal_size = self._disk_state()
+        return self._index is not None and mtime == self._loaded_mtime and journal_size == self._journal_offset
+
+    def _refresh(self):
+        """Brings the in-memory graph up to date. Caller holds the file lock and self._lock."""
+        mtime, _ = self._disk_state()
+        if self._index is None or mtime != self._loaded_mtime:
+            self._load_snapshot(mtime)
+        self._replay_journal()
+
+    def _load_snapshot(self, mtime):
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded_mtime = mtime
+        if mtime is None or not os.path.exists(self.path):
+            self._index = self._new_index()
+            self._documents = {}
+            self._stale = 0
+            return
+
+        self._index = faiss.read_index(self.path)
+        with open(self._meta_path(), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        documents = meta.get("documents", {})
+        if isinstance(documents, list):  # Saved before vector counts were tracked; rebuild for exact stats
+            documents = {document_id: [0, None] for document_id in documents}
+        self._documents = {int(document_id): entry for document_id, entry in documents.items()}
+        self._stale = meta.get("stale", 0)
+        logger.info(f"--- [CorpusIndex] Loaded {self._index.ntotal} vectors for {len(self._documents)} documents ---")
+
+    def _replay_journal(self):
+        # Applies the entries other workers appended since this process last looked
+        try:
+            with open(self._journal_path(), 'rb') as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self._journal_offset += len(data)
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            self._journal_entries += 1
+            if entry["op"] == "add":
+                self._add_vectors(entry["document"], entry.get("first_chunk_id"))
+            elif entry["op"] == "remove":
+                self._forget(entry["document"])
+
+    def _append_journal(self, entry):
+        # Caller holds the file lock and has replayed the journal, so this process is at its end
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        line = json.dumps(entry) + "\n"
+        with open(self._journal_path(), 'a', encoding='utf-8') as f:
+            f.write(line)
+        self._journal_offset += len(line.encode('utf-8'))
+        self._journal_entries += 1
+
+    def _write_snapshot(self):
+        """Writes the graph and meta and empties the journal. Caller holds the file lock and self._lock."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        faiss.write_index(self._index, self.path + ".tmp")
+        os.replace(self.path + ".tmp", self.path)
+
+        meta = {
+            "documents": {str(document_id): entry for document_id, entry in sorted(self._documents.items())},
+            "stale": self._stale,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+        }
+        with open(self._meta_path() + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(self._meta_path() + ".tmp", self._meta_path())
+        open(self._journal_path(), 'w').close()
+        self._loaded_mtime = os.stat(self._meta_path()).st_mtime_ns
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def save(self):
+        """Folds the journal into a fresh snapshot of the graph."""
+        with self._file_lock(), self._lock:
+            self._refresh()
+            self._write_snapshot()
+
+    def stats(self):
+        with self._file_lock(), self._lock:
+            self._refresh()
+            return {
+                "vectors": self._index.ntotal,
+                "documents": len(self._documents),
+                "stale_vectors": self._stale,
+                "journal_entries": self._journal_entries,
+                "m": self.m,
+                "ef_construction": self.ef_construction,
+                "ef_search": self.ef_search,
+            }
+
+    def _add_vectors(self, document_id, first_chunk_id=None):
+        """
+        Inserts a document's current vectors. With first_chunk_id (a journal replay) they are
+        only inserted if the document still has exactly those chunks and they are not in yet.
+        Returns the vectors added.
+        """
+        chunk_ids = list(
+            DocumentChunk.objects.filter(document_id=document_id)
+            .order_by('chunk_index')
+            .values_list('id', flat=True)
+        )
+        current_first = chunk_ids[0] if chunk_ids else None
+        if first_chunk_id is not None and current_first != first_chunk_id:
+            return 0  # Re-processed or deleted since; a later journal entry covers it
+        previous = self._documents.get(document_id)
+        if previous is not None and previous[1] is not None and previous[1] == current_first:
+            return 0  # Already in the graph
+
+        vectors = self.vector_store.load_float32(document_id)
+        if vectors is None:
+            return 0
+        if len(chunk_ids) != len(vectors):
+            logger.warning(f"--- [CorpusIndex] Skipping document {document_id}: {len(chunk_ids)} chunks but {len(vectors)} vectors ---")
+            return 0
+
+        if previous is not None:
+            self._stale += previous[0]  # Re-processed: the vectors of the old chunk ids are now dead
+        if len(vectors):
+            self._index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(chunk_ids, dtype="int64"))
+        self._documents[document_id] = [len(vectors), current_first]
+        return len(vectors)
+
+    def _forget(self, document_id):
+        previous = self._documents.pop(document_id, None)
+        if previous is not None:
+            self._stale += previous[0]
+        return previous is not None
+
+    def _record(self, entry):
+        # Journal a change; rewrite the graph once enough changes have piled up
+        self._append_journal(entry)
+        if self._journal_entries >= self.save_every:
+            self._write_snapshot()
+
+    def add_document(self, document_id):
+        """Incrementally inserts one document's vectors (called after ingestion)."""
+        with self._file_lock(), self._lock:
+            self._refresh()
+            before = self._documents.get(document_id)
+            added = self._add_vectors(document_id)
+            after = self._documents.get(document_id)
+            if after is not None and after != before:
+                self._record({"op": "add", "document": document_id, "first_chunk_id": after[1]})
+            return added
+
+    def remove_document(self, document_id):
+        """Forgets a document. Its vectors stay in the graph but are filtered out of results."""
+        with self._file_lock(), self._lock:
+            self._refresh()
+            if self._forget(document_id):
+                self._record({"op": "remove", "document": document_id})
+
+    def rebuild(self):
+        """Builds a fresh graph from every processed document in the vector store."""
+        with self._file_lock(), self._lock:
+            self._index = self._new_index()
+            self._documents = {}
+            self._stale = 0
+            total = 0
+            for document_id in Document.objects.filter(processing_status='processed').order_by('id').values_list('id', flat=True):
+                total += self._add_vectors(document_id)
+            self._write_snapshot()
+            return total
+
+    def search(self, query, k=10, ef_search=None, document_ids=None):
+        """
+        Returns up to k hits across the corpus as a list of (DocumentChunk, distance), nearest first.
+        ef_search trades latency for recall; document_ids optionally restricts the results.
+        """
+        if not self._is_current():
+            with self._file_lock(), self._lock:
+                self._refresh()
+
+        selector = None
+        if document_ids:
+            # Restrict inside the graph walk; filtering a global top-k afterwards leaves a few
+            # documents out of a large corpus with next to nothing
+            chunk_ids = np.fromiter(
+                DocumentChunk.objects.filter(document_id__in=document_ids).values_list('id', flat=True), dtype="int64"
+            )
+            if not len(chunk_ids):
+                return []
+            selector = faiss.IDSelectorBatch(chunk_ids)  # IndexIDMap2 translates it to the graph's internal ids
+
+        with self._lock:
+            total = self._index.ntotal
+            if total == 0:
+                return []
+            ef = ef_search or self.ef_search
+            if selector is not None:
+                fetch = min(total, k, len(chunk_ids))
+                # The walk still visits unselected nodes, so widen it by how selective the filter is
+                ef = max(ef, min(total, -(-fetch * total // len(chunk_ids))))
+            else:
+                # Over-fetch by the share of stale vectors; k + stale always leaves k live hits
+                live = max(1, total - self._stale)
+                fetch = min(total, k + self._stale, -(-k * total // live) * 2 + 10)
+            params = faiss.SearchParametersHNSW(efSearch=max(ef, fetch), sel=selector)
+            query = np.ascontiguousarray(query, dtype="float32").reshape(1, -1)
+            distances, ids = self._index.search(query, fetch, params=params)
+            documents = set(self._documents)
+
+        ranked = [(int(chunk_id), float(distance)) for chunk_id, distance in zip(ids[0], distances[0]) if chunk_id != -1]
+        chunks = DocumentChunk.objects.select_related('document').in_bulk([chunk_id for chunk_id, _ in ranked])
+
+        hits = []
+        for chunk_id, distance in ranked:
+            chunk = chunks.get(chunk_id)
+            if chunk is None or chunk.document_id not in documents:
+                continue
+            hits.append((chunk, distance))
+            if len(hits) >= k:
+                break
+        return hits
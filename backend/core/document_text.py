@@ -0,0 +1,45 @@
+import hashlib
+import json
+import zlib
+
+
+def page_text(text, is_pdf):
+    # How a page contributes to the full text: PDF pages get a line break each, empty ones are dropped
+    if is_pdf:
+        return text + "\n" if text else ""
+    return text
+
+
+# Builds a document's stored text while its pages stream through ingestion.
+# Pages are compressed as they arrive (zlib over JSON lines of [page_number, text]),
+# and the full text is hashed on the fly, so nothing is held uncompressed.
+class PageTextWriter:
+    def __init__(self, is_pdf):
+        self.is_pdf = is_pdf
+        self.page_count = 0
+        self.char_count = 0
+        self._compressor = zlib.compressobj(6)
+        self._blocks = []
+        self._digest = hashlib.sha256()
+
+    def add(self, page_number, text):
+        line = json.dumps([page_number, text]) + "\n"
+        self._blocks.append(self._compressor.compress(line.encode('utf-8')))
+        piece = page_text(text, self.is_pdf)
+        self._digest.update(piece.encode('utf-8'))
+        self.page_count += 1
+        self.char_count += len(piece)
+
+    def fields(self):
+        """Column values for a DocumentText row. Call once, after the last page."""
+        return {
+            "pages": b"".join(self._blocks) + self._compressor.flush(),
+            "page_count": self.page_count,
+            "char_count": self.char_count,
+            "content_hash": self._digest.hexdigest(),
+        }
+
+
+def decode_pages(blob):
+    """Returns the stored pages as a list of (page_number, text)."""
+    return [tuple(json.loads(line)) for line in zlib.decompress(bytes(blob)).decode('utf-8').splitlines()]
@@ -0,0 +1,67 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_chunk(text):
+    # all-MiniLM-L6-v2 is uncased, so case and whitespace differences embed identically
+    return " ".join(text.split()).lower()
+
+
+def chunk_hash(text):
+    return hashlib.sha256(normalize_chunk(text).encode('utf-8')).hexdigest()
+
+
+# Size-bounded LRU cache of chunk embeddings keyed by a normalized content hash.
+# Boilerplate clauses shared by many loan files (standard T&C annexes, sanction
+# letter templates) are embedded once and reused across uploads.
+class EmbeddingCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Returns a list with the cached vector for each key, or None on a miss."""
+        results = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, keys, vectors):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._entries[key] = np.array(vector, dtype="float32")
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
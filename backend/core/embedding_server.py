@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Wire format, both directions: 4-byte big-endian length + JSON header.
+# A successful response header is {"shape": [n, dim]} followed by n * dim raw float32 values.
+_LENGTH = struct.Struct('>I')
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            raise ConnectionError("Embedding server connection closed mid-message")
+        buf.extend(part)
+    return bytes(buf)
+
+
+def _send_json(sock, obj):
+    payload = json.dumps(obj).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_json(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class _EmbeddingHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            request = _recv_json(self.request)
+            texts = request.get("texts", [])
+            with self.server.encode_lock:
+                embeddings = self.server.model.encode(
+                    texts, batch_size=request.get("batch_size", 64), convert_to_numpy=True
+                )
+            embeddings = np.ascontiguousarray(embeddings, dtype="float32").reshape(len(texts), -1)
+            _send_json(self.request, {"shape": list(embeddings.shape)})
+            self.request.sendall(embeddings.tobytes())
+        except Exception as e:
+            logger.error(f"--- [EmbeddingServer] Request failed: {e} ---")
+            try:
+                _send_json(self.request, {"error": str(e)})
+            except OSError:
+                pass
+
+
+# Handler threads overlap socket I/O, but encode() runs one request at a time: the HF fast
+# tokenizer is not thread-safe ("Already borrowed") and an error here reaches every worker.
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, model):
+        self.model = model
+        self.encode_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket from a previous run
+        super().__init__(socket_path, _EmbeddingHandler)
+
+
+# Client used by web workers when EMBEDDING_SERVER_SOCKET is set.
+# A Unix socket connect costs microseconds, so each call uses a fresh connection.
+class EmbeddingClient:
+    def __init__(self, socket_path, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def encode(self, texts, batch_size=64):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            _send_json(sock, {"texts": list(texts), "batch_size": batch_size})
+            header = _recv_json(sock)
+            if "error" in header:
+                raise RuntimeError(f"Embedding server error: {header['error']}")
+            rows, dim = header["shape"]
+            data = _recv_exact(sock, rows * dim * 4)
+        return np.frombuffer(data, dtype="float32").reshape(rows, dim)
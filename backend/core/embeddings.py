@@ -0,0 +1,58 @@
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_server import EmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = getattr(settings, 'EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+EMBEDDING_SERVER_SOCKET = getattr(settings, 'EMBEDDING_SERVER_SOCKET', None)  # Unix socket of a shared embedding server
+
+_model = None
+_model_lock = threading.Lock()
+_encode_lock = threading.Lock()  # Ingestion and request threads share the model; its tokenizer is not thread-safe
+
+
+def get_model():
+    """
+    Returns the sentence transformer, loading it on first use.
+    Management commands and tests that never embed anything skip the load entirely.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info(f"--- [Embeddings] Loading model {EMBEDDING_MODEL_NAME} ---")
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+def encode_texts(texts, batch_size=64):
+    """
+    Embeds a list of strings and returns a float32 (n, dim) array. Uses the shared
+    embedding server when EMBEDDING_SERVER_SOCKET is set, otherwise the in-process model.
+    """
+    texts = list(texts)
+    if EMBEDDING_SERVER_SOCKET:
+        return EmbeddingClient(EMBEDDING_SERVER_SOCKET).encode(texts, batch_size=batch_size)
+    model = get_model()
+    with _encode_lock:
+        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return np.asarray(embeddings, dtype="float32").reshape(len(texts), -1)
+
+
+def warm_up():
+    """
+    Loads the model (or checks the embedding server is reachable) before the first request.
+    Called from the WSGI/ASGI entry points when EMBEDDING_WARM_UP is on.
+    """
+    try:
+        encode_texts(["warm up"])
+        logger.info("--- [Embeddings] Warm-up complete ---")
+    except Exception as e:
+        # The first real request will retry; a cold worker is better than one that fails to boot
+        logger.error(f"--- [Embeddings] Warm-up failed: {e} ---")
@@ -0,0 +1,36 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock shared by every thread and every process on the host that uses the
+    same lock file, for read-modify-write of files several workers update.
+    """
+    path = os.path.abspath(path)
+    with _thread_lock(path):  # flock is per open file, so threads of one process also need this
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,102 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Document, DocumentChunk
+from .rag_utils import bm25_index, index, process_document, set_processing_status, vector_store
+
+logger = logging.getLogger(__name__)
+
+INGESTION_ASYNC = getattr(settings, 'INGESTION_ASYNC', True)  # False runs ingestion inside the request
+INGESTION_WORKERS = getattr(settings, 'INGESTION_WORKERS', 2)  # Documents processed in parallel
+INGESTION_QUEUE_DEPTH = getattr(settings, 'INGESTION_QUEUE_DEPTH', 20)  # Max queued + running documents
+
+# Statuses left behind by a worker that died mid-document
+IN_PROGRESS_STATUSES = ('extracting', 'embedding')
+
+
+class QueueFull(Exception):
+    pass
+
+
+# In-process background queue for document ingestion.
+# The Document rows are the durable record of the queue: anything still 'pending'
+# (or stuck mid-processing after a crash) can be re-queued by process_pending_documents.
+class IngestionQueue:
+    def __init__(self, workers, max_depth):
+        self.workers = workers
+        self.max_depth = max_depth
+        self._executor = None
+        self._queued = set()  # Document ids queued or running
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest')
+        return self._executor
+
+    def depth(self):
+        return len(self._queued)
+
+    def submit(self, document_id):
+        """Queues a document for processing. Raises QueueFull when the queue is at capacity."""
+        with self._lock:
+            if document_id in self._queued:
+                return
+            if len(self._queued) >= self.max_depth:
+                raise QueueFull(f"Ingestion queue is full ({self.max_depth} documents).")
+            self._queued.add(document_id)
+            self._get_executor().submit(self._run, document_id)
+
+    def _run(self, document_id):
+        close_old_connections()
+        try:
+            run_ingestion(document_id)
+        finally:
+            with self._lock:
+                self._queued.discard(document_id)
+            close_old_connections()
+
+
+ingestion_queue = IngestionQueue(INGESTION_WORKERS, INGESTION_QUEUE_DEPTH)
+
+
+def run_ingestion(document_id):
+    """
+    Processes one document and records the outcome on the Document row.
+    Failures are stored as processing_status='failed' with the error message.
+    """
+    try:
+        document = Document.objects.get(pk=document_id)
+    except Document.DoesNotExist:
+        logger.warning(f"--- [Ingest] Document {document_id} was deleted before processing ---")
+        return False
+
+    try:
+        process_document(document)
+        logger.info(f"Document {document_id} processed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error processing document {document_id}: {str(e)}")
+        # Drop partial output so a retry starts clean
+        DocumentChunk.objects.filter(document_id=document_id).delete()
+        vector_store.delete(document_id)
+        index.remove(document_id)
+        bm25_index.remove(document_id)
+        set_processing_status(document, 'failed', error=str(e))
+        return False
+
+
+def enqueue_document(document):
+    """Runs ingestion in the background, or inline when INGESTION_ASYNC is off."""
+    if not INGESTION_ASYNC:
+        run_ingestion(document.id)
+        return
+    ingestion_queue.submit(document.id)
+
+
+def pending_documents():
+    return Document.objects.filter(processing_status__in=('pending',) + IN_PROGRESS_STATUSES).order_by('created_at')
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def cache_key(payload):
+    """Hash of everything that determines the completion: model, messages and sampling parameters."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# Persistent cache of deterministic (temperature 0) LLM completions in a local SQLite file.
+# Shared by every worker process on the host; bounded by entry count with LRU eviction
+# on last access, and entries older than ttl seconds are treated as misses.
+class LLMResponseCache:
+    def __init__(self, path, max_entries=5000, ttl=None):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl  # Seconds; None keeps entries until evicted
+        self._local = threading.local()  # One connection per thread
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """Returns the cached response for key, or None on a miss or an expired entry."""
+        connection = self._connection()
+        row = connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        response, created_at = row
+        if self.ttl is not None and now - created_at > self.ttl:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            with self._lock:
+                self.misses += 1
+                self.expired += 1
+            return None
+
+        connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key, response):
+        if self.max_entries <= 0:
+            return
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, response, now, now),
+        )
+        # Evict the least recently used entries beyond the bound
+        excess = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            with self._lock:
+                self.evictions += excess
+
+    def invalidate(self, key):
+        self._connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        """Deletes entries past their TTL. Returns the number removed."""
+        if self.ttl is None:
+            return 0
+        cursor = self._connection().execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    def clear(self):
+        """Deletes every entry. Returns the number removed."""
+        return self._connection().execute("DELETE FROM responses").rowcount
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
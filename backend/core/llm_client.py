@@ -0,0 +1,190 @@
+import itertools
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Worth retrying on another attempt (or another backend): overload and gateway errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """Raised without waiting on the network when every backend's circuit is open."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeout(Exception):
+    """Raised when a call runs out of its caller's deadline; the call is abandoned, not retried."""
+
+
+# Per-backend circuit breaker: opens after failure_threshold consecutive failures and
+# fails fast until reset_timeout has passed, then lets one trial request through.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True  # Half-open: one request decides
+            return True
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Ends a half-open trial that produced no verdict (e.g. interrupted), so the next request can try."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True when this failure (re)opens the circuit."""
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+# Shared keep-alive HTTP client for one or more OpenAI-compatible LLM servers.
+# Requests are spread round-robin over the backends whose circuit is closed; transient
+# failures are retried with jittered exponential backoff, preferring the next backend.
+class LLMClient:
+    def __init__(self, urls, connect_timeout=5.0, read_timeout=120.0, max_retries=2,
+                 retry_backoff=0.5, pool_size=10, failure_threshold=5, reset_timeout=30.0):
+        if not urls:
+            raise ValueError("LLMClient needs at least one backend URL.")
+        self.urls = list(urls)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breakers = {url: CircuitBreaker(failure_threshold, reset_timeout) for url in self.urls}
+        self._rotation = itertools.count()
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _pick_backend(self):
+        """Next backend in rotation whose circuit allows a request, or None."""
+        with self._lock:
+            start = next(self._rotation) % len(self.urls)
+        for url in self.urls[start:] + self.urls[:start]:
+            if self.breakers[url].allow():
+                return url
+        return None
+
+    def post_json(self, payload, deadline=None):
+        """
+        POSTs payload to a healthy backend and returns the decoded JSON body.
+        deadline (time.monotonic()) bounds the whole call, retries and backoff included.
+        Raises LLMUnavailable when every circuit is open, LLMTimeout past the deadline,
+        otherwise the last requests error.
+        """
+        return self._send(payload, deadline=deadline).json()
+
+    def stream_lines(self, payload, deadline=None):
+        """
+        POSTs payload as a streaming request and yields the response body line by line.
+        Retries and failover only happen until a backend accepts the request.
+        """
+        response = self._send(payload, stream=True, deadline=deadline)
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                yield line
+        finally:
+            response.close()
+
+    def _timeout_within(self, deadline):
+        """(connect, read) timeouts for the next attempt, capped at what is left of deadline."""
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+
+    def _send(self, payload, stream=False, deadline=None):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            timeout = self._timeout_within(deadline)
+            if timeout is None:
+                raise LLMTimeout("LLM call ran out of time before it could complete.") from last_error
+
+            url = self._pick_backend()
+            if url is None:
+                retry_after = min(breaker.retry_after() for breaker in self.breakers.values())
+                raise LLMUnavailable(
+                    f"All LLM backends are unavailable (circuit open); retry in {retry_after:.0f}s.",
+                    retry_after,
+                ) from last_error
+
+            breaker = self.breakers[url]
+            try:
+                response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    response.close()  # Hand the connection back to the pool before retrying
+                    response.raise_for_status()
+            except requests.exceptions.ReadTimeout as e:
+                # The backend accepted the generation and may still be running it; another
+                # attempt would only pile a second copy of the work on top, so give up here
+                if timeout[1] < self.timeout[1]:
+                    breaker.release_trial()  # Cut short by the caller's deadline, which says nothing about the backend
+                    raise LLMTimeout(f"LLM call timed out after the caller's deadline against {url}.") from e
+                if breaker.record_failure():
+                    logger.error(f"--- [LLM] Circuit open for {url}; failing fast for {breaker.reset_timeout:.0f}s ---")
+                logger.warning(f"--- [LLM] Attempt {attempt + 1} against {url} timed out after {timeout[1]:.0f}s; not retrying ---")
+                raise
+            except requests.exceptions.RequestException as e:
+                # Any transport failure counts, including ChunkedEncodingError/ContentDecodingError while reading the body
+                if breaker.record_failure():
+                    logger.error(f"--- [LLM] Circuit open for {url}; failing fast for {breaker.reset_timeout:.0f}s ---")
+                last_error = e
+                logger.warning(f"--- [LLM] Attempt {attempt + 1} against {url} failed: {e} ---")
+                if attempt < self.max_retries:
+                    # Full jitter keeps concurrent callers from retrying in lockstep
+                    delay = random.uniform(0, self.retry_backoff * (2 ** attempt))
+                    if deadline is not None:
+                        delay = min(delay, max(0.0, deadline - time.monotonic()))
+                    time.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release_trial()  # Never leave a half-open circuit waiting on a trial that is gone
+                raise
+
+            # Anything else (e.g. 400 for a bad payload) is the caller's problem, not the backend's health
+            breaker.record_success()
+            if not response.ok:
+                response.close()
+                response.raise_for_status()
+            return response
+
+        raise last_error
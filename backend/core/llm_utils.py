@@ -0,0 +1,142 @@
+import json
+import logging
+
+import requests
+from django.conf import settings
+
+from .llm_cache import LLMResponseCache, cache_key
+from .llm_client import LLMClient, LLMTimeout, LLMUnavailable
+
+logger = logging.getLogger(__name__)
+
+LOCAL_LLM_URL = getattr(settings, 'LOCAL_LLM_URL', "http://localhost:1234/v1/chat/completions")
+LOCAL_LLM_MODEL = getattr(settings, 'LOCAL_LLM_MODEL', "mistral-local")  # Often a placeholder for local servers
+# Several OpenAI-compatible servers can share the load; requests rotate between them
+LOCAL_LLM_URLS = getattr(settings, 'LOCAL_LLM_URLS', None) or [LOCAL_LLM_URL]
+
+llm_client = LLMClient(
+    LOCAL_LLM_URLS,
+    connect_timeout=getattr(settings, 'LLM_CONNECT_TIMEOUT', 5),
+    read_timeout=getattr(settings, 'LLM_READ_TIMEOUT', 120),
+    max_retries=getattr(settings, 'LLM_MAX_RETRIES', 2),
+    retry_backoff=getattr(settings, 'LLM_RETRY_BACKOFF', 0.5),
+    pool_size=getattr(settings, 'LLM_POOL_SIZE', 10),
+    failure_threshold=getattr(settings, 'LLM_CIRCUIT_FAILURE_THRESHOLD', 5),
+    reset_timeout=getattr(settings, 'LLM_CIRCUIT_RESET_TIMEOUT', 30),
+)
+
+LLM_CACHE_ENABLED = getattr(settings, 'LLM_CACHE_ENABLED', True)
+llm_cache = LLMResponseCache(
+    getattr(settings, 'LLM_CACHE_PATH', settings.BASE_DIR / 'llm_cache.sqlite3'),
+    max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 5000),
+    ttl=getattr(settings, 'LLM_CACHE_TTL', 7 * 24 * 3600),
+)
+
+def _completion_payload(prompt, stream=False):
+    return {
+        "model": LOCAL_LLM_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.0, # Set to 0.0 for maximum determinism
+        "stream": stream
+    }
+
+def _response_cache_key(payload):
+    # Only deterministic completions are cached; streamed and blocking calls share entries
+    if not LLM_CACHE_ENABLED or payload["temperature"] != 0.0:
+        return None
+    return cache_key({k: v for k, v in payload.items() if k != "stream"})
+
+def _cached_response(key):
+    try:
+        cached = llm_cache.get(key)
+    except Exception as e:
+        logger.warning(f"--- [LLM Cache] Lookup failed, calling the LLM: {e} ---")
+        return None
+    if cached is not None:
+        logger.info("--- [LLM Cache] Hit ---")
+    return cached
+
+def _store_response(key, content):
+    try:
+        llm_cache.put(key, content)
+    except Exception as e:
+        logger.warning(f"--- [LLM Cache] Could not store response: {e} ---")
+
+def call_local_llm(prompt, use_cache=True, deadline=None):
+    """
+    Helper function to call the local LLM (Mistral)
+    Assumes an OpenAI-compatible API endpoint.
+    Deterministic (temperature 0) completions are served from llm_cache when possible;
+    use_cache=False forces a fresh generation (which still refreshes the cache).
+    deadline (time.monotonic()) abandons the call with LLMTimeout once it passes.
+    """
+    payload = _completion_payload(prompt)
+    key = _response_cache_key(payload)
+    if key and use_cache:
+        cached = _cached_response(key)
+        if cached is not None:
+            return cached
+
+    content = _post_completion(payload, deadline)
+    if key:
+        _store_response(key, content)
+    return content
+
+def stream_local_llm(prompt, use_cache=True):
+    """
+    Streaming variant of call_local_llm: yields the answer as text deltas while the model
+    generates it. A cached answer is yielded in one piece; a completed stream is cached.
+    """
+    payload = _completion_payload(prompt, stream=True)
+    key = _response_cache_key(payload)
+    if key and use_cache:
+        cached = _cached_response(key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    lines = llm_client.stream_lines(payload)
+    try:
+        for line in lines:
+            # OpenAI-compatible servers send 'data: {json chunk}' lines, then 'data: [DONE]'
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+            except (ValueError, KeyError, IndexError, TypeError):
+                logger.warning(f"--- [LLM] Skipping malformed stream chunk: {data[:200]} ---")
+                continue
+            if delta:
+                parts.append(delta)
+                yield delta
+    except requests.exceptions.RequestException as e:
+        logger.error(f"--- [LLM ERROR] Stream failed: {str(e)} ---")
+        raise Exception(f"RequestException: {str(e)}")
+    finally:
+        lines.close()  # Releases the upstream connection, also when our consumer went away
+
+    if key:
+        _store_response(key, "".join(parts).strip())
+
+def _post_completion(payload, deadline=None):
+    try:
+        json_response = llm_client.post_json(payload, deadline=deadline)
+        content = json_response['choices'][0]['message']['content']
+        return content.strip()
+
+    except (LLMUnavailable, LLMTimeout) as e:
+        logger.error(f"--- [LLM ERROR] {e} ---")
+        raise
+    except requests.exceptions.ConnectionError:
+        logger.error(f"--- [LLM ERROR] Connection refused. Is the local server running at {', '.join(LOCAL_LLM_URLS)}? ---")
+        raise Exception(f"ConnectionError: Cannot connect to local LLM at {', '.join(LOCAL_LLM_URLS)}.")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"--- [LLM ERROR] Request failed: {str(e)} ---")
+        raise Exception(f"RequestException: {str(e)}")
+    except (KeyError, IndexError, TypeError) as e:
+            logger.error(f"--- [LLM ERROR] Unexpected JSON response format from local LLM: {json_response} ---")
+            raise Exception(f"JSONParseError: Invalid response format from LLM. {e}")
@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from core.models import Document, DocumentChunk
+from core.views import DocumentChunkListView, DocumentListView
+
+
+# Listing latency and payload size against a seeded database; the seed data is rolled back
+class Command(BaseCommand):
+    help = "Benchmark document/chunk listings (full, paginated, projected, 304) on seeded data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=10000, help="Documents to seed")
+        parser.add_argument('--chunks', type=int, default=2000, help="Chunks to seed for one document")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per case")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            document = self._seed(options['documents'], options['chunks'])
+            self._run_cases(document, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _seed(self, documents, chunks):
+        started = time.perf_counter()
+        Document.objects.bulk_create(
+            [
+                Document(
+                    title=f"bench-loan-{i}.pdf", file=f"documents/bench-loan-{i}.pdf", file_type='pdf',
+                    size=250000, pages=40, processing_status='processed',
+                )
+                for i in range(documents)
+            ],
+            batch_size=1000,
+        )
+        document = Document.objects.order_by('-id').first()
+        DocumentChunk.objects.bulk_create(
+            [
+                DocumentChunk(document=document, chunk_index=i, page_number=i // 50 + 1, content="lorem ipsum dolor " * 100)
+                for i in range(chunks)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"Seeded {documents} documents and {chunks} chunks in {time.perf_counter() - started:.2f}s (rolled back at the end)")
+        return document
+
+    def _run_cases(self, document, repeat):
+        documents = DocumentListView.as_view()
+        chunks = DocumentChunkListView.as_view()
+        chunk_kwargs = {'document_id': document.id}
+        cases = [
+            ("documents: full list", documents, {}, {}),
+            ("documents: page of 50", documents, {'page_size': 50}, {}),
+            ("documents: metadata-only page", documents, {'page_size': 50, 'fields': 'id,title,processing_status,updated_at'}, {}),
+            ("chunks: full list", chunks, {}, chunk_kwargs),
+            ("chunks: page of 100", chunks, {'page_size': 100}, chunk_kwargs),
+            ("chunks: page of 100 without content", chunks, {'page_size': 100, 'fields': 'chunk_index,page_number'}, chunk_kwargs),
+        ]
+        for label, view, params, kwargs in cases:
+            response, stats = self._measure(view, params, kwargs, repeat)
+            self.stdout.write(f"{label:42s} {stats}")
+            # The same request again, revalidated with the ETag the client got
+            _, stats = self._measure(view, params, kwargs, repeat, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.stdout.write(f"{label + ' (304)':42s} {stats}")
+
+    def _measure(self, view, params, kwargs, repeat, **headers):
+        factory = APIRequestFactory()
+        samples = []
+        for _ in range(repeat):
+            request = factory.get('/api/bench/', params, HTTP_HOST='localhost', **headers)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = view(request, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                samples.append(time.perf_counter() - started)
+        stats = (
+            f"status={response.status_code} median={statistics.median(samples) * 1000:.1f}ms "
+            f"bytes={len(response.content)} queries={len(queries)}"
+        )
+        return response, stats
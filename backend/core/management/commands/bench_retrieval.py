@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.embeddings import encode_texts
+from core.models import Document, DocumentChunk
+from core.rag_utils import (
+    RETRIEVAL_CANDIDATES, bm25_index, ensure_bm25_index, ensure_document_index, index, reciprocal_rank_fusion,
+)
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50={statistics.median(samples) * 1000:.2f}ms p95={p95 * 1000:.2f}ms"
+
+
+# Query latency of vector, BM25 and fused retrieval over the processed documents
+class Command(BaseCommand):
+    help = "Benchmark per-document vector, BM25 and hybrid retrieval latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=10, help="Documents to sample")
+        parser.add_argument('--queries', type=int, default=50, help="Queries per document")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        timings = {"embed": [], "vector": [], "bm25": [], "fusion": []}
+
+        documents = Document.objects.filter(processing_status='processed').order_by('-created_at')[:options['documents']]
+        for document in documents:
+            chunk_count = ensure_document_index(document.id)
+            if not chunk_count:
+                continue
+            ensure_bm25_index(document.id)
+
+            contents = list(DocumentChunk.objects.filter(document=document).values_list('content', flat=True))
+            for _ in range(options['queries']):
+                words = rng.choice(contents).split()
+                start = rng.randrange(max(1, len(words) - 8))
+                query = " ".join(words[start:start + 8])
+                candidates = min(RETRIEVAL_CANDIDATES, chunk_count)
+
+                started = time.perf_counter()
+                query_embedding = encode_texts([query])
+                timings["embed"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                _, ids = index.search(document.id, query_embedding, k=candidates)
+                timings["vector"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                keyword_hits = bm25_index.search(document.id, query, candidates)
+                timings["bm25"].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                reciprocal_rank_fusion([[int(i) for i in ids], [i for i, _ in keyword_hits]])
+                timings["fusion"].append(time.perf_counter() - started)
+
+        if not timings["vector"]:
+            self.stdout.write("No processed documents with chunks to benchmark.")
+            return
+        for stage, samples in timings.items():
+            self.stdout.write(f"{stage:>7}: {_percentiles(samples)} over {len(samples)} queries")
@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from core.embeddings import encode_texts
+from core.models import Document, DocumentChunk
+from core.rag_utils import RETRIEVAL_CANDIDATES, embed_chunks, embedding_dim, vector_store
+from core.vector_store import measure_recall
+
+
+# Measures how much retrieval accuracy compact vector storage gives up against exact float32 search
+class Command(BaseCommand):
+    help = "Report recall@k of float16/int8 vector storage (as reloaded from disk) against exact float32 search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('document_ids', nargs='*', type=int, help="Only check these documents")
+        parser.add_argument(
+            '--k', type=int, default=RETRIEVAL_CANDIDATES,
+            help=f"Neighbours compared per query (vector search feeds RETRIEVAL_CANDIDATES={RETRIEVAL_CANDIDATES} to fusion)",
+        )
+        parser.add_argument('--limit', type=int, default=20, help="Max documents to sample")
+        parser.add_argument('--queries', type=int, default=20, help="Queries per document")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        documents = Document.objects.filter(processing_status='processed').order_by('-created_at')
+        if options['document_ids']:
+            documents = documents.filter(id__in=options['document_ids'])
+
+        dtypes = ('float16', 'int8')
+        weighted_recall = {dtype: 0.0 for dtype in dtypes}
+        total_queries = 0
+
+        for document in documents[:options['limit']]:
+            chunks = list(
+                DocumentChunk.objects.filter(document=document)
+                .order_by('chunk_index')
+                .values_list('content', flat=True)
+            )
+            if not chunks:
+                continue
+
+            # Exact float32 reference: the stored vectors if kept at full precision, otherwise re-embedded
+            stored = vector_store.load(document.id)
+            if stored is not None and stored.dtype == np.float32 and len(stored) == len(chunks):
+                reference = np.asarray(stored)
+            else:
+                reference = embed_chunks(chunks)
+
+            # Question-like queries: short random spans of the document's own text
+            spans = []
+            for _ in range(options['queries']):
+                words = rng.choice(chunks).split()
+                start = rng.randrange(max(1, len(words) - 12))
+                spans.append(" ".join(words[start:start + 12]))
+            queries = encode_texts(spans).reshape(-1, embedding_dim)
+
+            line = [f"Document {document.id} ({len(chunks)} chunks):"]
+            for dtype in dtypes:
+                recall = measure_recall(reference, queries, options['k'], dtype)
+                weighted_recall[dtype] += recall * len(queries)
+                line.append(f"{dtype} recall@{options['k']}={recall:.3f}")
+            total_queries += len(queries)
+            self.stdout.write("  ".join(line))
+
+        if not total_queries:
+            self.stdout.write("No processed documents with chunks to check.")
+            return
+
+        for dtype in dtypes:
+            bytes_per_vector = embedding_dim * np.dtype(dtype).itemsize
+            self.stdout.write(self.style.SUCCESS(
+                f"{dtype}: mean recall@{options['k']}={weighted_recall[dtype] / total_queries:.4f}, "
+                f"{bytes_per_vector} bytes/vector vs {embedding_dim * 4} for float32"
+            ))
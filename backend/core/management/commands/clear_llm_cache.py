@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.llm_utils import llm_cache
+
+
+# Invalidates cached LLM responses, e.g. after swapping the model behind LOCAL_LLM_URL
+class Command(BaseCommand):
+    help = "Delete cached LLM responses (all of them, or only those past LLM_CACHE_TTL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expired', action='store_true', help="Only delete entries older than LLM_CACHE_TTL")
+
+    def handle(self, *args, **options):
+        if options['expired']:
+            removed = llm_cache.purge_expired()
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired LLM responses"))
+        else:
+            removed = llm_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} cached LLM responses"))
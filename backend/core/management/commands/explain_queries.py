@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import ChatMessage, ChatSession, Document, DocumentChunk
+
+
+# Query plans and latency of the hot chunk/chat/listing queries against a seeded database.
+# Run it before and after a schema change (e.g. `migrate core <previous>`) to compare; the seed data is rolled back.
+class Command(BaseCommand):
+    help = "EXPLAIN and time the chunk, chat history and document listing queries on seeded data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=1000, help="Documents to seed")
+        parser.add_argument('--chunks', type=int, default=100, help="Chunks per document")
+        parser.add_argument('--sessions', type=int, default=3, help="Chat sessions per document")
+        parser.add_argument('--messages', type=int, default=10, help="Messages per chat session")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query")
+        parser.add_argument('--no-plans', action='store_true', help="Only print timings")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database: {connection.vendor}")
+        with transaction.atomic():
+            document, session = self._seed(options)
+            self._run_queries(document, session, options['repeat'], not options['no_plans'])
+            transaction.set_rollback(True)
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        Document.objects.bulk_create(
+            [Document(title=f"bench-loan-{i}.pdf", file=f"documents/bench-loan-{i}.pdf") for i in range(options['documents'])],
+            batch_size=1000,
+        )
+        # Re-read for primary keys (MySQL's bulk_create does not return them)
+        documents = list(Document.objects.filter(title__startswith="bench-loan-").order_by('id'))
+        DocumentChunk.objects.bulk_create(
+            (
+                DocumentChunk(document=document, chunk_index=i, page_number=i // 10 + 1, content="lorem ipsum dolor sit amet")
+                for document in documents
+                for i in range(options['chunks'])
+            ),
+            batch_size=2000,
+        )
+        ChatSession.objects.bulk_create(
+            [ChatSession(document=document) for document in documents for _ in range(options['sessions'])],
+            batch_size=1000,
+        )
+        sessions = list(ChatSession.objects.filter(document__in=documents).order_by('id'))
+        ChatMessage.objects.bulk_create(
+            (
+                ChatMessage(session=session, question=f"q{i}", answer=f"a{i}")
+                for session in sessions
+                for i in range(options['messages'])
+            ),
+            batch_size=2000,
+        )
+        self.stdout.write(
+            f"Seeded {len(documents)} documents, {len(documents) * options['chunks']} chunks, "
+            f"{len(sessions)} sessions and {len(sessions) * options['messages']} messages "
+            f"in {time.perf_counter() - started:.2f}s (rolled back at the end)"
+        )
+        # Something in the middle, so no query gets lucky with the first or last rows
+        middle = documents[len(documents) // 2]
+        return middle, ChatSession.objects.filter(document=middle).first()
+
+    def _run_queries(self, document, session, repeat, show_plans):
+        queries = [
+            ("chunk page of a document", DocumentChunk.objects.filter(document=document).order_by('chunk_index')[:100]),
+            ("top-k chunks by index", DocumentChunk.objects.filter(document=document, chunk_index__in=[3, 17, 42, 64, 99])),
+            ("chat sessions of a document", ChatSession.objects.filter(document=document).order_by('-created_at', '-id')[:50]),
+            ("latest messages of a session", ChatMessage.objects.filter(session=session).order_by('-created_at', '-id')[:20]),
+            ("document listing page", Document.objects.order_by('-created_at', '-id')[:50]),
+        ]
+        for label, queryset in queries:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())  # .all() so every run hits the database
+                samples.append(time.perf_counter() - started)
+            self.stdout.write(f"{label:32s} median={statistics.median(samples) * 1000:.2f}ms")
+            if show_plans:
+                for line in queryset.explain().splitlines():
+                    self.stdout.write(f"    {line}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.ingestion import pending_documents, run_ingestion
+
+
+# Drains documents left 'pending' (or stuck mid-processing) after a restart or crash
+class Command(BaseCommand):
+    help = "Process documents that are still pending or were interrupted mid-ingestion."
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        for document_id in list(pending_documents().values_list('id', flat=True)):
+            ok = run_ingestion(document_id)
+            if ok:
+                processed += 1
+            else:
+                failed += 1
+            self.stdout.write(f"Document {document_id}: {'processed' if ok else 'failed'}")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} document(s), {failed} failed."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Document
+from core.rag_utils import rebuild_document_vectors, vector_store
+
+
+# Regenerates on-disk vectors from the DocumentChunk rows already in the database
+class Command(BaseCommand):
+    help = "Rebuild missing per-document vector files from existing DocumentChunk rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('document_ids', nargs='*', type=int, help="Only rebuild these documents")
+        parser.add_argument('--all', action='store_true', help="Rebuild vectors even if they already exist on disk")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.filter(processing_status='processed').order_by('id')
+        if options['document_ids']:
+            documents = documents.filter(id__in=options['document_ids'])
+
+        rebuilt = 0
+        for document in documents:
+            if not options['all'] and vector_store.has(document.id):
+                continue
+            count = rebuild_document_vectors(document)
+            rebuilt += 1
+            self.stdout.write(f"Rebuilt {count} vectors for document {document.id} ({document.title})")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt vectors for {rebuilt} document(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.models import RiskScanJob
+from core.risk_scans import resume_scan, risk_scan_runner, scan_summary, unfinished_jobs
+
+
+# Finishes batch risk scans interrupted by a restart or crash, in the foreground
+class Command(BaseCommand):
+    help = "Resume risk scans that are still pending or were interrupted mid-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int, help="Only resume these scans")
+        parser.add_argument('--retry-failed', action='store_true', help="Also re-scan documents that failed")
+
+    def handle(self, *args, **options):
+        jobs = RiskScanJob.objects.filter(id__in=options['job_ids']) if options['job_ids'] else unfinished_jobs()
+        for job in list(jobs):
+            requeued = resume_scan(job, retry_failed=options['retry_failed'])
+            self.stdout.write(f"Scan {job.id}: scanning {requeued} document(s)...")
+            risk_scan_runner.run(job.id)
+            summary = scan_summary(job)
+            self.stdout.write(self.style.SUCCESS(
+                f"Scan {job.id}: {summary['progress']['done']} done, {summary['progress']['failed']} failed, "
+                f"{summary['documents_with_risks']} with risks"
+            ))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.embedding_server import EmbeddingServer
+from core.embeddings import EMBEDDING_MODEL_NAME, get_model
+
+
+# Runs one embedding model process that every web worker talks to over a Unix socket
+class Command(BaseCommand):
+    help = "Serve sentence embeddings to all web workers over a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=getattr(settings, 'EMBEDDING_SERVER_SOCKET', None),
+                            help="Socket path (defaults to EMBEDDING_SERVER_SOCKET)")
+
+    def handle(self, *args, **options):
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError("No socket path: pass --socket or set EMBEDDING_SERVER_SOCKET.")
+
+        model = get_model()
+        server = EmbeddingServer(socket_path, model)
+        self.stdout.write(self.style.SUCCESS(f"Serving {EMBEDDING_MODEL_NAME} on {socket_path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_documentchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='processing_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
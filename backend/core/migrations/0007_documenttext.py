@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pages', models.BinaryField()),
+                ('page_count', models.IntegerField(default=0)),
+                ('char_count', models.IntegerField(default=0)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('source_hash', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='extracted_text', to='core.document')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_documenttext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskReportEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('risk_name', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('result', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_entries', to='core.document')),
+            ],
+            options={
+                'unique_together': {('document', 'risk_name')},
+            },
+        ),
+    ]
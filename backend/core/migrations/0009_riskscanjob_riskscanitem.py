@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_riskreportentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskScanJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('mode', models.CharField(default='per_risk', max_length=20)),
+                ('document_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RiskScanItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('found_risks', models.JSONField(default=list)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='risk_scan_items', to='core.document')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.riskscanjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'status'], name='core_risksc_job_id_701e53_idx')],
+            },
+        ),
+    ]
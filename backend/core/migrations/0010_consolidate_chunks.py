@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def consolidate_chunks(apps, schema_editor):
+    Chunk = apps.get_model('core', 'Chunk')
+    DocumentChunk = apps.get_model('core', 'DocumentChunk')
+
+    # Legacy Chunk rows are only kept for documents that have no DocumentChunk rows;
+    # elsewhere DocumentChunk is the copy processing wrote last. Page numbers were never stored (0).
+    chunked_documents = DocumentChunk.objects.values('document_id')
+    legacy = Chunk.objects.exclude(document_id__in=chunked_documents).order_by('document_id', 'chunk_index', 'id')
+    batch, seen = [], set()
+    for chunk in legacy.iterator(chunk_size=1000):
+        key = (chunk.document_id, chunk.chunk_index)
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append(DocumentChunk(document_id=chunk.document_id, chunk_index=chunk.chunk_index, page_number=0, content=chunk.content))
+        if len(batch) >= 1000:
+            DocumentChunk.objects.bulk_create(batch)
+            batch = []
+    DocumentChunk.objects.bulk_create(batch)
+
+    # Keep the first row of any duplicated (document, chunk_index) so the unique constraint can be added
+    duplicates = (
+        DocumentChunk.objects.values('document_id', 'chunk_index')
+        .annotate(n=Count('id'), keep_id=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates.iterator():
+        DocumentChunk.objects.filter(document_id=row['document_id'], chunk_index=row['chunk_index']).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_riskscanjob_riskscanitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(consolidate_chunks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_consolidate_chunks'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chunk',
+            name='document',
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'created_at'], name='core_chatme_session_76a3ef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['document', 'created_at'], name='core_chatse_documen_de2d92_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['created_at', 'id'], name='core_docume_created_5aeef9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='documentchunk',
+            constraint=models.UniqueConstraint(fields=('document', 'chunk_index'), name='unique_document_chunk_index'),
+        ),
+        migrations.DeleteModel(
+            name='Chunk',
+        ),
+    ]
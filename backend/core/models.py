@@ -7,27 +7,26 @@ class Document(models.Model):
     file_type = models.CharField(max_length=10, blank=True)  # Type/extension of the file
     size = models.IntegerField(null=True, blank=True)  # File size in bytes
     pages = models.IntegerField(null=True, blank=True)  # Number of pages (if applicable)
-    processing_status = models.CharField(max_length=50, default='pending')  # Status: pending, processed, failed
+    processing_status = models.CharField(max_length=50, default='pending')  # Status: pending, extracting, embedding, processed, failed
+    processing_error = models.TextField(blank=True, default='')  # Error message when processing failed
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the uploaded file
     created_at = models.DateTimeField(auto_now_add=True)  # Timestamp when created
     updated_at = models.DateTimeField(auto_now=True)  # Timestamp when last updated
 
-    def __str__(self):
-        return self.title  # String representation returns the document title
-
-# Chunk model stores a segment of a document's content
-class Chunk(models.Model):
-    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')  # Link to parent document
-    content = models.TextField()  # Text content of the chunk
-    chunk_index = models.IntegerField()  # Order/index of the chunk in the document
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]  # Listing order / cursor pagination
 
     def __str__(self):
-        return f"Chunk {self.chunk_index} of {self.document.title}"
+        return self.title  # String representation returns the document title
 
 # ChatSession model represents a chat session related to a document
 class ChatSession(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chat_sessions')  # Associated document
     created_at = models.DateTimeField(auto_now_add=True)  # When the session was created
 
+    class Meta:
+        indexes = [models.Index(fields=['document', 'created_at'])]  # A document's chat history, newest first
+
     def __str__(self):
         return f"ChatSession {self.id} for {self.document.title}"
 
@@ -38,15 +37,78 @@ class ChatMessage(models.Model):
     answer = models.TextField()  # System's answer
     created_at = models.DateTimeField(auto_now_add=True)  # When the message was created
 
+    class Meta:
+        indexes = [models.Index(fields=['session', 'created_at'])]  # A session's messages in order
+
     def __str__(self):
         return f"Message {self.id} in Session {self.session.id}"
 
-# DocumentChunk model stores a chunk of a document with page information
+# DocumentChunk model stores a chunk of a document with page information (the only chunk table)
 class DocumentChunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='docchunks')  # Linked document
     chunk_index = models.IntegerField()  # Index of the chunk
-    page_number = models.IntegerField()  # Page number in the document
+    page_number = models.IntegerField()  # Page number in the document (0 for chunks migrated without one)
     content = models.TextField()  # Text content of the chunk
 
+    class Meta:
+        # Also serves every lookup/ordering by (document, chunk_index)
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'chunk_index'], name='unique_document_chunk_index'),
+        ]
+
     def __str__(self):
         return f"Chunk {self.chunk_index} (Page {self.page_number}) of {self.document.title}"
+
+# DocumentText stores a document's extracted text once, compressed, so it is not re-parsed from the file
+class DocumentText(models.Model):
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='extracted_text')  # Linked document
+    pages = models.BinaryField()  # zlib-compressed JSON lines of [page_number, text]
+    page_count = models.IntegerField(default=0)  # Number of stored pages
+    char_count = models.IntegerField(default=0)  # Length of the full text
+    content_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the full text
+    source_hash = models.CharField(max_length=64, blank=True)  # Document.content_hash of the file it was extracted from
+    created_at = models.DateTimeField(auto_now_add=True)  # When the text was extracted
+
+    def __str__(self):
+        return f"Text of {self.document.title} ({self.page_count} pages)"
+
+# RiskReportEntry stores the latest interceptor verdict for one risk on one document
+class RiskReportEntry(models.Model):
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='risk_entries')  # Analyzed document
+    risk_name = models.CharField(max_length=255)  # Risk name from risks.md
+    fingerprint = models.CharField(max_length=64)  # Hash of text, risk definition, model/prompt version and mode
+    result = models.JSONField()  # The report entry as returned by the API
+    updated_at = models.DateTimeField(auto_now=True)  # When the verdict was computed
+
+    class Meta:
+        unique_together = ('document', 'risk_name')
+
+    def __str__(self):
+        return f"{self.risk_name} for {self.document.title}"
+
+# RiskScanJob is a batch run of the Risk Interceptor over many documents
+class RiskScanJob(models.Model):
+    status = models.CharField(max_length=20, default='pending')  # Status: pending, running, completed
+    mode = models.CharField(max_length=20, default='per_risk')  # Interceptor analysis mode
+    document_count = models.IntegerField(default=0)  # Documents in the scan
+    created_at = models.DateTimeField(auto_now_add=True)  # When the scan was requested
+    updated_at = models.DateTimeField(auto_now=True)  # Last status change
+    finished_at = models.DateTimeField(null=True, blank=True)  # When the last document finished
+
+    def __str__(self):
+        return f"RiskScanJob {self.id} ({self.status})"
+
+# RiskScanItem tracks one document within a batch risk scan
+class RiskScanItem(models.Model):
+    job = models.ForeignKey(RiskScanJob, on_delete=models.CASCADE, related_name='items')  # Parent scan
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, related_name='risk_scan_items')  # Scanned document
+    status = models.CharField(max_length=20, default='pending')  # Status: pending, running, done, failed
+    found_risks = models.JSONField(default=list)  # Names of the risks found in the document
+    error = models.TextField(blank=True, default='')  # Why the scan of this document failed
+    updated_at = models.DateTimeField(auto_now=True)  # Last status change
+
+    class Meta:
+        indexes = [models.Index(fields=['job', 'status'])]
+
+    def __str__(self):
+        return f"Scan item {self.id} of job {self.job_id} ({self.status})"
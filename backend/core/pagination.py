@@ -0,0 +1,40 @@
+from rest_framework.pagination import CursorPagination
+
+
+# Cursor pagination is opt-in on these endpoints: clients that send neither 'cursor'
+# nor 'page_size' keep getting the plain list the frontend expects.
+def pagination_requested(request):
+    return 'cursor' in request.query_params or 'page_size' in request.query_params
+
+
+# Newest chat sessions first; the id breaks ties between sessions created in the same instant
+class ChatSessionCursorPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+# List views mix this in to paginate only when the client asks for it
+class OptInCursorPaginationMixin:
+    @property
+    def paginator(self):
+        if not pagination_requested(self.request):
+            return None
+        return super().paginator
+
+
+# Newest documents first
+class DocumentCursorPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+# A document's chunks in reading order
+class ChunkCursorPagination(CursorPagination):
+    ordering = 'chunk_index'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
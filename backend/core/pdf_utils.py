@@ -0,0 +1,96 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber  # For PDF text extraction
+
+# Kept free of Django imports so worker processes can import it under any start method
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """
+    The extraction process pool, created on first use and shared by every ingestion thread.
+    Workers are spawned, not forked: forking a multi-threaded process that has torch and
+    FAISS loaded can deadlock the child.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    # A worker died (e.g. killed for memory); the next PDF gets a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def extract_page_range(path, start, stop):
+    """
+    Extracts pages [start, stop) of a PDF. Runs inside a worker process, which
+    opens the file itself so only the path and page numbers cross the process boundary.
+    Returns a list of (page_number, text) with 1-based page numbers.
+    """
+    with pdfplumber.open(path) as pdf:
+        return [(i + 1, _page_text(pdf.pages[i])) for i in range(start, stop)]
+
+
+def _page_text(page):
+    text = page.extract_text() or ""
+    page.close()  # Drop pdfplumber's cached layout objects for this page
+    return text
+
+
+def count_pages(path):
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pdf_pages(path, workers=1, pages_per_task=8, min_parallel_pages=16):
+    """
+    Yields every page of a PDF as (page_number, text), in page order.
+    Large files are split into page ranges of pages_per_task pages and spread across a process pool;
+    small files (or workers <= 1) are extracted serially in this process.
+    At most workers * 2 ranges are in flight, so memory is bounded by workers * pages_per_task
+    pages of text whatever the page count.
+    """
+    page_count = count_pages(path)
+    if workers <= 1 or page_count < min_parallel_pages:
+        with pdfplumber.open(path) as pdf:
+            for i, page in enumerate(pdf.pages):
+                yield i + 1, _page_text(page)
+        return
+
+    # Fixed-size ranges: each task re-opens the PDF, but growing them with the page count would let
+    # the text held in flight grow with it too
+    task_size = max(1, pages_per_task)
+    ranges = deque((start, min(start + task_size, page_count)) for start in range(0, page_count, task_size))
+
+    executor = get_pool(workers)
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            # Keep every worker busy plus one range queued each, and hand results back in page order
+            while ranges and len(in_flight) < workers * 2:
+                in_flight.append(executor.submit(extract_page_range, path, *ranges.popleft()))
+            yield from in_flight.popleft().result()
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise
+    finally:
+        # Stopped early (error or closed generator): don't leave this file's ranges queued in the shared pool
+        for future in in_flight:
+            future.cancel()
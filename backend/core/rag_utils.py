@@ -1,89 +1,473 @@
 import os
-import pdfplumber  # For PDF text extraction
+import time
+import hashlib
+import logging
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 from docx import Document as DocxDocument  # For DOCX text extraction
-from .models import Chunk, DocumentChunk
-from sentence_transformers import SentenceTransformer
+from django.conf import settings
+from django.db import transaction
+from .models import Document, DocumentChunk, DocumentText
+from .pdf_utils import iter_pdf_pages
+from .document_text import PageTextWriter, decode_pages, page_text
+from .answer_cache import SemanticAnswerCache
+from .embedding_cache import EmbeddingCache, chunk_hash
+from .embeddings import encode_texts
+from .vector_store import DocumentIndex, VectorStore
+from .corpus_index import CorpusIndex
+from .bm25 import BM25Index, reciprocal_rank_fusion
 import numpy as np
-import faiss
 
-# Load sentence transformer model for embeddings
-model = SentenceTransformer('all-MiniLM-L6-v2')
+logger = logging.getLogger(__name__)
 
-# In-memory FAISS index for vector search
+# The sentence transformer is loaded lazily by core.embeddings on first use
 embedding_dim = 384  # Embedding size for the model
-index = faiss.IndexFlatL2(embedding_dim)
 
-doc_embeddings_map = {}  # Maps document.id to its chunk embeddings
+# Precision of stored and indexed vectors: 'float32' (exact), 'float16' or 'int8'
+VECTOR_DTYPE = getattr(settings, 'VECTOR_DTYPE', 'float32')
 
-def extract_text(document):
+# In-memory FAISS indexes for vector search, one per document.
+# Chunk text is not kept in memory; it is read from DocumentChunk for the final top-k only.
+index = DocumentIndex(embedding_dim, VECTOR_DTYPE)
+
+# On-disk copy of every document's embeddings so they survive restarts
+vector_store = VectorStore(settings.VECTOR_STORE_DIR, embedding_dim, VECTOR_DTYPE)
+
+# Corpus-wide HNSW index for cross-document search, updated as documents are processed
+corpus_index = CorpusIndex(
+    vector_store,
+    getattr(settings, 'CORPUS_INDEX_PATH', settings.VECTOR_STORE_DIR / 'corpus.hnsw'),
+    m=getattr(settings, 'CORPUS_HNSW_M', 32),
+    ef_construction=getattr(settings, 'CORPUS_HNSW_EF_CONSTRUCTION', 80),
+    ef_search=getattr(settings, 'CORPUS_HNSW_EF_SEARCH', 64),
+    save_every=getattr(settings, 'CORPUS_INDEX_SAVE_EVERY', 50),
+)
+
+# Per-document BM25 keyword index, fused with vector search for exact terms (MCLR, EMI, clause numbers)
+bm25_index = BM25Index(max_documents=getattr(settings, 'BM25_MAX_DOCUMENTS', 500))
+
+# Hybrid retrieval for ask_question
+RETRIEVAL_TOP_K = getattr(settings, 'RETRIEVAL_TOP_K', 4)  # Chunks sent to the LLM
+RETRIEVAL_CANDIDATES = getattr(settings, 'RETRIEVAL_CANDIDATES', 20)  # Candidates from each retriever before fusion
+VECTOR_DISTANCE_THRESHOLD = 1.5  # Vector hits further than this are ignored
+
+# Batch sizes for the ingestion path
+EMBEDDING_BATCH_SIZE = getattr(settings, 'EMBEDDING_BATCH_SIZE', 64)  # Chunks per model forward pass
+CHUNK_INSERT_BATCH_SIZE = getattr(settings, 'CHUNK_INSERT_BATCH_SIZE', 500)  # Rows per bulk INSERT
+INGEST_WINDOW_SIZE = getattr(settings, 'INGEST_WINDOW_SIZE', 256)  # Chunks embedded and flushed together
+
+# Chunk embeddings shared across uploads (boilerplate clauses are embedded once)
+embedding_cache = EmbeddingCache(getattr(settings, 'EMBEDDING_CACHE_SIZE', 20000))
+
+# Answers to earlier questions about the same document, matched by question embedding
+answer_cache = SemanticAnswerCache(
+    threshold=getattr(settings, 'ANSWER_CACHE_THRESHOLD', 0.92),
+    max_entries_per_document=getattr(settings, 'ANSWER_CACHE_MAX_PER_DOCUMENT', 50),
+    max_documents=getattr(settings, 'ANSWER_CACHE_MAX_DOCUMENTS', 500),
+    ttl=getattr(settings, 'ANSWER_CACHE_TTL', 24 * 3600),
+)
+
+# Parallel PDF extraction
+PDF_EXTRACTION_WORKERS = getattr(settings, 'PDF_EXTRACTION_WORKERS', None) or os.cpu_count() or 1  # Worker processes
+PDF_PAGES_PER_TASK = getattr(settings, 'PDF_PAGES_PER_TASK', 8)  # Pages handed to a worker at a time
+PDF_PARALLEL_MIN_PAGES = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 16)  # Smaller PDFs are extracted serially
+
+@contextmanager
+def timed_stage(timings, name):
+    # Adds the wall-clock time of one ingestion stage to the timings dict
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+def format_timings(timings):
+    return ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items())
+
+def embed_chunks(chunks):
+    """
+    Encodes a list of chunk strings in batches and returns a float32 (n, dim) array.
+    Chunks already in the embedding cache are not re-encoded.
+    """
+    embeddings = np.empty((len(chunks), embedding_dim), dtype="float32")
+    if not chunks:
+        return embeddings
+
+    keys = [chunk_hash(chunk) for chunk in chunks]
+    missing = []
+    for i, cached in enumerate(embedding_cache.get_many(keys)):
+        if cached is None:
+            missing.append(i)
+        else:
+            embeddings[i] = cached
+
+    if missing:
+        encoded = encode_texts([chunks[i] for i in missing], batch_size=EMBEDDING_BATCH_SIZE).reshape(-1, embedding_dim)
+        embeddings[missing] = encoded
+        embedding_cache.put_many([keys[i] for i in missing], encoded)
+    return embeddings
+
+def file_sha256(file):
+    # Hashes an uploaded or stored file in chunks without reading it into memory at once
+    digest = hashlib.sha256()
+    for block in file.chunks():
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+def find_duplicate_document(content_hash, exclude_id=None):
+    """Returns an already-processed document with the same file hash, if any."""
+    if not content_hash:
+        return None
+    return (
+        Document.objects.filter(content_hash=content_hash, processing_status='processed')
+        .exclude(pk=exclude_id)
+        .order_by('created_at')
+        .first()
+    )
+
+def iter_pages(document):
+    """
+    Yields a document as (page_number, text) in page order without holding the whole file's text.
+    PDF pages are extracted in parallel; DOCX and TXT files are a single page.
+    """
     ext = os.path.splitext(document.file.name)[1].lower()
     path = document.file.path
-    text = ""
 
     if ext == '.pdf':
-        # Extract text from each page of the PDF
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        yield from iter_pdf_pages(
+            path,
+            workers=PDF_EXTRACTION_WORKERS,
+            pages_per_task=PDF_PAGES_PER_TASK,
+            min_parallel_pages=PDF_PARALLEL_MIN_PAGES,
+        )
     elif ext == '.docx':
         doc = DocxDocument(path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        yield 1, "".join(para.text + "\n" for para in doc.paragraphs)
     elif ext == '.txt':
         with open(path, 'r', encoding='utf-8') as f:
-            text = f.read()
+            yield 1, f.read()
     else:
         raise ValueError("Unsupported file format")
-    
-    return text
+
+def extract_pages(document):
+    # All pages as a list of (page_number, text)
+    return list(iter_pages(document))
+
+def is_pdf(document):
+    return os.path.splitext(document.file.name)[1].lower() == '.pdf'
+
+def extract_text(document):
+    # Full document text, one line break after each non-empty PDF page
+    pdf = is_pdf(document)
+    return "".join(page_text(text, pdf) for _, text in iter_pages(document))
+
+def load_document_text(document):
+    """The stored DocumentText of a document, or None if missing or extracted from a different file."""
+    stored = DocumentText.objects.filter(document=document).first()
+    if stored is None or (document.content_hash and stored.source_hash != document.content_hash):
+        return None
+    return stored
+
+def save_document_text(document, writer):
+    fields = writer.fields()
+    fields["source_hash"] = document.content_hash
+    stored, _ = DocumentText.objects.update_or_create(document=document, defaults=fields)
+    return stored
+
+def get_document_text(document):
+    """
+    Full document text (same as extract_text) read from DocumentText.
+    Documents processed before text was stored are extracted once and backfilled.
+    """
+    pdf = is_pdf(document)
+    stored = load_document_text(document)
+    if stored is None:
+        writer = PageTextWriter(pdf)
+        for page_number, text in iter_pages(document):
+            writer.add(page_number, text)
+        stored = save_document_text(document, writer)
+        logger.info(f"--- [Text] Stored extracted text for document {document.id} ({stored.char_count} chars) ---")
+    return "".join(page_text(text, pdf) for _, text in decode_pages(stored.pages))
+
+def iter_chunks(pages, chunk_size=300, overlap=50):
+    """
+    Splits (page_number, text) pages into overlapping word chunks as they arrive.
+    The overlap is carried across page boundaries, so the output matches chunking the joined text.
+    Yields (page_number, chunk), where page_number is the page of the chunk's first word.
+    """
+    step = chunk_size - overlap
+    words = deque()  # (word, page_number) not yet emitted past the overlap
+
+    for page_number, text in pages:
+        words.extend((word, page_number) for word in text.split())
+        while len(words) >= chunk_size:
+            yield words[0][1], " ".join(word for word, _ in islice(words, chunk_size))
+            for _ in range(step):
+                words.popleft()
+
+    # Tail of the document: shorter chunks, same stride
+    while words:
+        yield words[0][1], " ".join(word for word, _ in islice(words, chunk_size))
+        for _ in range(min(step, len(words))):
+            words.popleft()
+
+def chunk_pages(pages, chunk_size=300, overlap=50):
+    # All chunks as a list of (page_number, chunk)
+    return list(iter_chunks(pages, chunk_size, overlap))
 
 def chunk_text(text, chunk_size=300, overlap=50):
     # Split text into overlapping word chunks
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
+    return [chunk for _, chunk in iter_chunks([(1, text)], chunk_size, overlap)]
+
+def iter_windows(items, size):
+    # Groups an iterable into lists of at most `size` items
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def set_processing_status(document, status, error=""):
+    """Moves a document to a new processing status: pending -> extracting -> embedding -> processed / failed."""
+    document.processing_status = status
+    document.processing_error = error
+    document.save(update_fields=['processing_status', 'processing_error', 'updated_at'])
 
 def process_document(document):
-    # Extract text and split into chunks
-    text = extract_text(document)
-    chunks = chunk_text(text)
-
-    embeddings = []
-
-    for i, chunk in enumerate(chunks):
-        # Save each chunk to the database (page_number defaulted to 1)
-        DocumentChunk.objects.create(
-            document=document,
-            chunk_index=i,
-            page_number=1,
-            content=chunk
-        )
-        # Generate embedding for the chunk
-        embedding = model.encode(chunk)
-        embeddings.append(embedding)
+    """
+    Streams a document through extract -> chunk -> embed -> store.
+    Chunks are embedded, inserted and indexed INGEST_WINDOW_SIZE at a time, so peak
+    memory depends on the window size rather than on the size of the document.
+    """
+    timings = {}
+    page_count = 0
+    chunk_count = 0
+    # Re-processing an unchanged file reads the stored text instead of parsing the file again
+    stored_text = load_document_text(document)
+    text_writer = PageTextWriter(is_pdf(document)) if stored_text is None else None
+
+    def counted_pages():
+        nonlocal page_count
+        pages = decode_pages(stored_text.pages) if stored_text is not None else iter_pages(document)
+        for page_number, text in pages:
+            page_count += 1
+            if text_writer is not None:
+                text_writer.add(page_number, text)
+            yield page_number, text
+
+    # Re-processing replaces old chunks and vectors
+    set_processing_status(document, 'extracting')
+    DocumentChunk.objects.filter(document=document).delete()
+    index.remove(document.id)
+    bm25_index.remove(document.id)
+    answer_cache.invalidate(document.id)
 
-    embeddings_np = np.array(embeddings).astype("float32")
-    index.add(embeddings_np)
+    windows = iter_windows(iter_chunks(counted_pages()), INGEST_WINDOW_SIZE)
+    with vector_store.writer(document.id) as vector_writer:
+        while True:
+            # Pull the next window of chunks; extraction and chunking happen lazily here
+            with timed_stage(timings, "extract"):
+                window = next(windows, None)
+            if window is None:
+                break
+            if chunk_count == 0:
+                set_processing_status(document, 'embedding')
 
-    # Store embeddings and chunks in memory
-    doc_embeddings_map[document.id] = {
-        "chunks": chunks,
-        "embeddings": embeddings_np
-    }
+            # Generate the window's embeddings in batched forward passes
+            with timed_stage(timings, "embed"):
+                embeddings_np = embed_chunks([chunk for _, chunk in window])
+
+            # Save the window's chunks with their real page numbers in one transaction
+            with timed_stage(timings, "db"):
+                with transaction.atomic():
+                    DocumentChunk.objects.bulk_create(
+                        [
+                            DocumentChunk(document=document, chunk_index=chunk_count + i, page_number=page_number, content=chunk)
+                            for i, (page_number, chunk) in enumerate(window)
+                        ],
+                        batch_size=CHUNK_INSERT_BATCH_SIZE,
+                    )
+
+            with timed_stage(timings, "index"):
+                index.add(document.id, embeddings_np, np.arange(chunk_count, chunk_count + len(window)))
+                vector_writer.append(embeddings_np)
+                bm25_index.add_chunks(document.id, [(chunk_count + i, chunk) for i, (_, chunk) in enumerate(window)])
+
+            chunk_count += len(window)
 
     # Update document metadata
     document.processing_status = 'processed'
+    document.processing_error = ""
     document.size = os.path.getsize(document.file.path)
     document.file_type = os.path.splitext(document.file.name)[1].replace('.', '')
-    document.pages = text.count('\f') + 1 if document.file_type == 'pdf' else None
+    document.pages = page_count if document.file_type == 'pdf' else None
     document.save()
+    if text_writer is not None:
+        save_document_text(document, text_writer)
+
+    with timed_stage(timings, "corpus"):
+        add_to_corpus_index(document.id)
+
+    timings["total"] = sum(timings.values())
+    logger.info(f"--- [Ingest] Processed {chunk_count} chunks for document {document.id}: {format_timings(timings)} ---")
+
+def add_to_corpus_index(document_id):
+    # The corpus index is a secondary search path; a failure here must not fail ingestion
+    try:
+        corpus_index.add_document(document_id)
+    except Exception as e:
+        logger.error(f"--- [CorpusIndex] Could not add document {document_id}: {e} ---")
+
+def clone_document(source, document):
+    """
+    Gives a re-uploaded file the chunks and vectors of an identical, already-processed
+    document instead of extracting and embedding it again.
+    Returns False when the source has no stored vectors: the caller queues the document for
+    normal ingestion, which reuses the copied text but has to embed (kept off the request path).
+    """
+    answer_cache.invalidate(document.id)
+    source_text = load_document_text(source)
+    if source_text is not None:
+        DocumentText.objects.update_or_create(document=document, defaults={
+            "pages": source_text.pages,
+            "page_count": source_text.page_count,
+            "char_count": source_text.char_count,
+            "content_hash": source_text.content_hash,
+            "source_hash": document.content_hash,
+        })
+
+    if not vector_store.copy(source.id, document.id):
+        logger.info(f"--- [Ingest] Document {source.id} has no stored vectors; {document.id} needs a full ingestion ---")
+        return False
+
+    DocumentChunk.objects.filter(document=document).delete()
+    source_chunks = (
+        DocumentChunk.objects.filter(document=source)
+        .order_by('chunk_index')
+        .values_list('chunk_index', 'page_number', 'content')
+        .iterator(chunk_size=INGEST_WINDOW_SIZE)
+    )
+    with transaction.atomic():
+        for window in iter_windows(source_chunks, INGEST_WINDOW_SIZE):
+            DocumentChunk.objects.bulk_create(
+                [
+                    DocumentChunk(document=document, chunk_index=chunk_index, page_number=page_number, content=content)
+                    for chunk_index, page_number, content in window
+                ],
+                batch_size=CHUNK_INSERT_BATCH_SIZE,
+            )
+    index.remove(document.id)
+    bm25_index.remove(document.id)
+
+    document.processing_status = 'processed'
+    document.processing_error = ""
+    document.size = source.size
+    document.file_type = source.file_type
+    document.pages = source.pages
+    document.save()
+    add_to_corpus_index(document.id)
+    logger.info(f"--- [Ingest] Document {document.id} is a duplicate of {source.id}; reused its chunks and vectors ---")
+    return True
+
+def ensure_document_index(document_id):
+    """
+    Makes sure a document's vectors are in the in-memory index and returns its chunk count.
+    After a restart the vectors are memory-mapped from the vector store, so nothing has to be
+    re-embedded. Returns None if the document has no usable vectors.
+    """
+    if document_id in index:
+        return index.count(document_id)
+
+    embeddings = vector_store.load_float32(document_id)
+    if embeddings is None:
+        return None
+
+    chunk_count = DocumentChunk.objects.filter(document_id=document_id).count()
+    if chunk_count != len(embeddings):
+        logger.warning(f"--- [VectorStore] Document {document_id} has {chunk_count} chunks but {len(embeddings)} vectors. Rebuild needed. ---")
+        return None
+
+    # Concurrent first questions may all get here; only one of them installs the vectors
+    chunk_count = index.add_if_absent(document_id, embeddings)
+    logger.info(f"--- [VectorStore] Loaded {chunk_count} vectors for document {document_id} from disk ---")
+    return chunk_count
+
+def fetch_chunks(document_id, chunk_indexes):
+    """Returns {chunk_index: content} for just the requested chunks of a document."""
+    return dict(
+        DocumentChunk.objects.filter(document_id=document_id, chunk_index__in=[int(i) for i in chunk_indexes])
+        .values_list('chunk_index', 'content')
+    )
+
+def ensure_bm25_index(document_id):
+    # Rebuilds a document's keyword index from DocumentChunk after a restart or LRU eviction
+    if document_id in bm25_index:
+        return
+    chunks = (
+        DocumentChunk.objects.filter(document_id=document_id)
+        .order_by('chunk_index')
+        .values_list('chunk_index', 'content')
+        .iterator(chunk_size=INGEST_WINDOW_SIZE)
+    )
+    bm25_index.add_chunks(document_id, chunks)
+
+def document_version(document_id):
+    """A document's updated_at, bumped whenever it is (re)processed; None if it no longer exists."""
+    return Document.objects.filter(pk=document_id).values_list('updated_at', flat=True).first()
+
+def retrieve_chunks(document_id, question, top_k=RETRIEVAL_TOP_K, question_embedding=None):
+    """
+    Hybrid retrieval for one document: FAISS vector search and BM25 keyword search,
+    fused with reciprocal rank fusion. question_embedding skips re-embedding the question.
+    Returns (chunk_indexes, chunk_texts), or None if the document has no vectors.
+    """
+    chunk_count = ensure_document_index(document_id)
+    if chunk_count is None:
+        return None
+    if not chunk_count:
+        return [], []
+
+    candidates = min(RETRIEVAL_CANDIDATES, chunk_count)
+    if question_embedding is None:
+        question_embedding = encode_texts([question])
+    distances, ids = index.search(document_id, question_embedding, k=candidates)
+    vector_ranking = [int(chunk_index) for distance, chunk_index in zip(distances, ids) if distance < VECTOR_DISTANCE_THRESHOLD]
+
+    ensure_bm25_index(document_id)
+    keyword_ranking = [chunk_index for chunk_index, _ in bm25_index.search(document_id, question, candidates)]
+
+    chunk_indexes = reciprocal_rank_fusion([vector_ranking, keyword_ranking])[:top_k]
+    logger.info(f"Retrieval for document {document_id}: vector={vector_ranking[:top_k]} keyword={keyword_ranking[:top_k]} fused={chunk_indexes}")
+    if not chunk_indexes:
+        logger.warning(f"No relevant chunks found for question: {question[:50]}...")
+        # Fallback to first few chunks
+        chunk_indexes = list(range(min(3, chunk_count)))
+
+    # Only the final top-k chunk texts are read from the database
+    chunk_texts = fetch_chunks(document_id, chunk_indexes)
+    chunk_indexes = [i for i in chunk_indexes if i in chunk_texts]
+    return chunk_indexes, [chunk_texts[i] for i in chunk_indexes]
+
+def rebuild_document_vectors(document):
+    """
+    Re-embeds a document's existing DocumentChunk rows and writes them to the vector store.
+    Returns the number of vectors written.
+    """
+    chunks = (
+        DocumentChunk.objects.filter(document=document)
+        .order_by('chunk_index')
+        .values_list('content', flat=True)
+        .iterator(chunk_size=INGEST_WINDOW_SIZE)
+    )
+    with vector_store.writer(document.id) as vector_writer:
+        for window in iter_windows(chunks, INGEST_WINDOW_SIZE):
+            vector_writer.append(embed_chunks(window))
 
-    # Debug info
-    print(f"[INFO] Processed {len(chunks)} chunks for document ID {document.id}")
-    print(f"[INFO] Embeddings shape: {embeddings_np.shape}")
-    print(f"[INFO] doc_embeddings_map keys: {list(doc_embeddings_map.keys())}")
+    # Drop any stale in-memory copy so the next question reloads from disk
+    index.remove(document.id)
+    return vector_writer.count
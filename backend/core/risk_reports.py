@@ -0,0 +1,77 @@
+import hashlib
+import logging
+
+from django.db import transaction
+
+from .models import RiskReportEntry
+from .rag_utils import load_document_text
+from .risk_utils import analysis_version, analyze_loan_text, load_knowledge_base, risk_definition_hash
+
+logger = logging.getLogger(__name__)
+
+
+def entry_fingerprint(text_hash, risk, mode):
+    key = "|".join((text_hash, risk_definition_hash(risk), analysis_version(), mode))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _save_entries(document, results, fingerprints):
+    # Failed verdicts (LLM errors, timeouts) are not stored, so the next request retries them
+    with transaction.atomic():
+        for name, result in results.items():
+            if "error" in result:
+                RiskReportEntry.objects.filter(document=document, risk_name=name).delete()
+                continue
+            RiskReportEntry.objects.update_or_create(
+                document=document,
+                risk_name=name,
+                defaults={"fingerprint": fingerprints[name], "result": result},
+            )
+        # Risks removed from risks.md
+        RiskReportEntry.objects.filter(document=document).exclude(risk_name__in=list(fingerprints)).delete()
+
+
+def get_risk_report(document, loan_text, mode, use_cache=True, log_tag="Interceptor ID"):
+    """
+    Returns (report, prompt_stats) for a document, re-evaluating only the risks whose
+    persisted verdict is missing or stale: the document text, the risk's definition in
+    risks.md, the model/prompt version or the mode changed since it was computed.
+    use_cache=False re-evaluates every risk.
+    """
+    stored_text = load_document_text(document)
+    text_hash = stored_text.content_hash if stored_text is not None else hashlib.sha256(loan_text.encode('utf-8')).hexdigest()
+    knowledge_base = load_knowledge_base()  # One snapshot for fingerprints, analysis and the report
+    risks = knowledge_base.risks
+    fingerprints = {risk['name']: entry_fingerprint(text_hash, risk, mode) for risk in risks}
+
+    existing = {entry.risk_name: entry for entry in RiskReportEntry.objects.filter(document=document)}
+    stale = {
+        name for name, fingerprint in fingerprints.items()
+        if not use_cache or name not in existing or existing[name].fingerprint != fingerprint
+    }
+
+    results = {name: entry.result for name, entry in existing.items() if name not in stale}
+    if stale:
+        logger.info(f"--- [{log_tag}] Re-evaluating {len(stale)} of {len(risks)} risks for document {document.id} ---")
+        fresh_report, prompt_stats = analyze_loan_text(
+            loan_text, log_tag=log_tag, mode=mode, use_cache=use_cache, risk_names=stale, knowledge_base=knowledge_base,
+        )
+        # Keyed by each entry's canonical risk_name, never by position
+        fresh = {result['risk_name']: result for result in fresh_report}
+        results.update(fresh)
+        _save_entries(document, fresh, fingerprints)
+    else:
+        logger.info(f"--- [{log_tag}] Reusing the stored report for document {document.id} ---")
+        prompt_stats = {
+            "mode": mode,
+            "llm_calls": 0,
+            "retried_risks": 0,
+            "full_prompt_tokens": 0,
+            "sent_prompt_tokens": 0,
+            "saved_tokens": 0,
+            "saved_percent": 0.0,
+        }
+
+    prompt_stats["reused_risks"] = len(risks) - len(stale)
+    prompt_stats["evaluated_risks"] = len(stale)
+    return [results[risk['name']] for risk in risks], prompt_stats
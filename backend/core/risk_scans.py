@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Document, RiskScanItem, RiskScanJob
+from .rag_utils import get_document_text
+from .risk_reports import get_risk_report
+
+logger = logging.getLogger(__name__)
+
+RISK_SCAN_WORKERS = getattr(settings, 'RISK_SCAN_WORKERS', 2)  # Documents scanned in parallel (all jobs together)
+RISK_SCAN_DOCUMENTS_PER_MINUTE = getattr(settings, 'RISK_SCAN_DOCUMENTS_PER_MINUTE', 30)  # Throughput cap; 0 disables it
+
+MIN_TEXT_LENGTH = 50  # Same guardrail as the interceptor endpoints
+
+# Items left behind by a worker that died mid-document are picked up again on resume
+UNFINISHED_STATUSES = ('pending', 'running')
+
+
+# Spaces out document starts so a scan stays under per_minute, shared by all worker threads
+class RateLimiter:
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(start - now)
+
+
+# Runs batch risk scans in the background. Each job gets a dispatcher thread; the
+# documents of every job share one bounded worker pool and one rate limiter.
+# RiskScanJob/RiskScanItem rows are the durable record, so a crashed scan can be resumed.
+class RiskScanRunner:
+    def __init__(self, workers, per_minute):
+        self.workers = workers
+        self.rate_limiter = RateLimiter(per_minute)
+        self._executor = None
+        self._running = set()  # Job ids with a live dispatcher
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='risk-scan')
+            return self._executor
+
+    def is_running(self, job_id):
+        return job_id in self._running
+
+    def submit(self, job_id):
+        """Starts (or resumes) a job in the background. Returns False if it is already running here."""
+        with self._lock:
+            if job_id in self._running:
+                return False
+            self._running.add(job_id)
+        threading.Thread(target=self._dispatch, args=(job_id,), name=f'risk-scan-job-{job_id}', daemon=True).start()
+        return True
+
+    def _dispatch(self, job_id):
+        close_old_connections()
+        try:
+            self.run(job_id)
+        except Exception as e:
+            logger.error(f"--- [Risk Scan] Job {job_id} stopped: {e} ---")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+            close_old_connections()
+
+    def run(self, job_id):
+        """Scans every unfinished item of a job and blocks until they are done."""
+        job = RiskScanJob.objects.get(pk=job_id)
+        job.status = 'running'
+        job.finished_at = None
+        job.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+        item_ids = list(
+            job.items.filter(status__in=UNFINISHED_STATUSES).order_by('id').values_list('id', flat=True)
+        )
+        logger.info(f"--- [Risk Scan] Job {job_id}: scanning {len(item_ids)} documents ---")
+        executor = self._get_executor()
+        wait([executor.submit(self._scan_item, item_id, job.mode) for item_id in item_ids])
+
+        job.status = 'completed'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'updated_at'])
+        logger.info(f"--- [Risk Scan] Job {job_id} completed ---")
+
+    def _scan_item(self, item_id, mode):
+        self.rate_limiter.wait()
+        close_old_connections()
+        try:
+            scan_item(item_id, mode)
+        finally:
+            close_old_connections()
+
+
+risk_scan_runner = RiskScanRunner(RISK_SCAN_WORKERS, RISK_SCAN_DOCUMENTS_PER_MINUTE)
+
+
+def scan_item(item_id, mode):
+    """Runs the interceptor over one document of a scan and records the outcome on its item."""
+    item = RiskScanItem.objects.select_related('document').get(pk=item_id)
+    item.status = 'running'
+    item.save(update_fields=['status', 'updated_at'])
+
+    document = item.document
+    try:
+        if document is None:
+            raise ValueError("Document was deleted.")
+        if document.processing_status != 'processed':
+            raise ValueError(f"Document is not processed (status: {document.processing_status}).")
+
+        loan_text = get_document_text(document)
+        if len(loan_text) < MIN_TEXT_LENGTH:
+            report, errors = [], []
+        else:
+            # Reuses stored verdicts, so resumed or repeated scans only pay for stale risks
+            report, _ = get_risk_report(document, loan_text, mode, log_tag="Risk Scan")
+            errors = [f"{entry['risk_name']}: {entry['error']}" for entry in report if entry.get("error")]
+
+        item.found_risks = [entry['risk_name'] for entry in report if entry.get("found")]
+        item.status = 'failed' if errors else 'done'
+        item.error = "; ".join(errors)
+    except Exception as e:
+        logger.error(f"--- [Risk Scan] Item {item_id} failed: {e} ---")
+        item.status = 'failed'
+        item.error = str(e)
+    item.save(update_fields=['found_risks', 'status', 'error', 'updated_at'])
+
+
+def create_scan(document_ids, mode):
+    """
+    Creates a scan over the given documents, or every processed document when document_ids is None.
+    Returns (job, ids that do not exist).
+    """
+    documents = Document.objects.all()
+    if document_ids is None:
+        documents = documents.filter(processing_status='processed')
+    else:
+        documents = documents.filter(id__in=document_ids)
+    found_ids = list(documents.order_by('id').values_list('id', flat=True))
+    missing_ids = sorted(set(document_ids or []) - set(found_ids))
+
+    job = RiskScanJob.objects.create(mode=mode, document_count=len(found_ids))
+    RiskScanItem.objects.bulk_create(
+        [RiskScanItem(job=job, document_id=document_id) for document_id in found_ids],
+        batch_size=500,
+    )
+    return job, missing_ids
+
+
+def resume_scan(job, retry_failed=True):
+    """Puts a job's interrupted (and optionally failed) items back in the queue."""
+    statuses = UNFINISHED_STATUSES + (('failed',) if retry_failed else ())
+    return job.items.filter(status__in=statuses).update(status='pending', error='')
+
+
+def unfinished_jobs():
+    return RiskScanJob.objects.filter(status__in=('pending', 'running')).order_by('created_at')
+
+
+def scan_summary(job):
+    """Progress and aggregated results of a scan: item counts per status and documents per risk found."""
+    status_counts = {row['status']: row['n'] for row in job.items.values('status').annotate(n=Count('id'))}
+    risk_counts = Counter()
+    documents_with_risks = 0
+    for found_risks in job.items.filter(status='done').values_list('found_risks', flat=True).iterator():
+        risk_counts.update(found_risks)
+        documents_with_risks += bool(found_risks)
+    return {
+        "progress": {status: status_counts.get(status, 0) for status in ('pending', 'running', 'done', 'failed')},
+        "risk_counts": dict(risk_counts.most_common()),
+        "documents_with_risks": documents_with_risks,
+    }
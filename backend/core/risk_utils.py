@@ -0,0 +1,527 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .llm_client import LLMTimeout
+from .llm_utils import LOCAL_LLM_MODEL, call_local_llm
+
+logger = logging.getLogger(__name__)
+
+RISK_PROMPT_TOKEN_BUDGET = getattr(settings, 'RISK_PROMPT_TOKEN_BUDGET', 1500)
+RISK_CLAUSE_MAX_CHARS = getattr(settings, 'RISK_CLAUSE_MAX_CHARS', 400)
+RISK_LLM_MAX_WORKERS = getattr(settings, 'RISK_LLM_MAX_WORKERS', 4)
+RISK_LLM_TIMEOUT = getattr(settings, 'RISK_LLM_TIMEOUT', 150)
+RISK_ANALYSIS_MODE = getattr(settings, 'RISK_ANALYSIS_MODE', 'per_risk')
+
+# Analysis modes, selectable per request with "mode"
+MODE_PER_RISK = 'per_risk'  # One prompt per triggered risk, sent concurrently
+MODE_COMBINED = 'combined'  # One prompt for all triggered risks; failed risks re-run per risk
+ANALYSIS_MODES = (MODE_PER_RISK, MODE_COMBINED)
+
+RISK_PROMPT_VERSION = 1  # Bump when the risk prompts change, so persisted verdicts are re-evaluated
+
+CHARS_PER_TOKEN = 4  # Rough estimate for English text; good enough for budgeting
+SENTENCE_BOUNDARY = re.compile(r'[.;!?](?=\s)|\n\s*\n')
+EXCERPT_SEPARATOR = "\n[...]\n"
+
+
+# Aho-Corasick automaton over every risk keyword.
+# One pass over the loan text finds all hits for all risks, with their offsets,
+# instead of one str.find() scan per keyword per risk.
+def fold_case(text):
+    """
+    Lowercases text without changing its length, so match offsets index the original text.
+    str.lower() can grow a character ('İ' -> 'i̇'); those keep only their first lowercase character.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char.lower()[0] for char in text)
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        """keywords: iterable of (keyword, payload) pairs; keywords must already be case-folded (fold_case)."""
+        self._goto = [{}]  # state -> {char: next state}
+        self._fail = [0]
+        self._output = [[]]  # state -> [(keyword, payload)] ending at this state
+
+        for keyword, payload in keywords:
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((keyword, payload))
+
+        # Breadth-first pass to set failure links and inherit outputs of suffix states
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Returns every keyword hit as (start, end, keyword, payload), in order of end offset."""
+        hits = []
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, payload in output[state]:
+                hits.append((position - len(keyword) + 1, position + 1, keyword, payload))
+        return hits
+
+
+def parse_keywords(keyword_string):
+    # Robust parser: remove quotes, split by comma, strip whitespace ('"kw1," "kw2"' -> ['kw1', 'kw2'])
+    return [fold_case(k.strip()) for k in keyword_string.replace('"', '').split(',') if k.strip()]
+
+
+def parse_risk_knowledge_base(content):
+    """Parses the text of risks.md into a list of risk objects."""
+    risks = []
+    risk_blocks = re.split(r'(?:^|\n)# Risk:\s*', content)
+
+    for block in risk_blocks:
+        if not block.strip():
+            continue
+
+        lines = block.strip().split('\n')
+        risk_name = lines[0].strip()
+
+        risk_obj = {"name": risk_name}
+
+        for line in lines[1:]:
+            if line.startswith('- **Description:**'):
+                risk_obj['description'] = line.split('**', 2)[-1].strip()
+            elif line.startswith('- **Why it\'s harmful:**'):
+                risk_obj['harmful'] = line.split('**', 2)[-1].strip()
+            elif line.startswith('- **Keywords to find:**'):
+                # This captures the keyword string, e.g., '"kw1," "kw2"'
+                risk_obj['keywords'] = line.split('**', 2)[-1].strip()
+
+        if 'name' in risk_obj and 'description' in risk_obj:
+            risk_obj['keyword_list'] = parse_keywords(risk_obj.get('keywords', '""'))
+            risks.append(risk_obj)
+
+    return risks
+
+
+# Parsed risks.md plus its compiled keyword automaton, rebuilt whenever the file changes on disk.
+# A reload builds a new snapshot and swaps it in with one assignment, so a reader always gets
+# risks and a matcher from the same file (the matcher's risk positions index into risks).
+class KnowledgeBase(NamedTuple):
+    signature: tuple
+    risks: list
+    matcher: KeywordMatcher
+
+
+_knowledge_base = KnowledgeBase(None, [], KeywordMatcher([]))
+_knowledge_base_lock = threading.Lock()
+
+
+def _risks_file_path():
+    return str(settings.BASE_DIR / 'risks.md')
+
+
+def load_knowledge_base():
+    """
+    Returns the current KnowledgeBase snapshot of risks.md, re-parsed when the file's mtime or size changes.
+    Callers that look at the risks more than once hold on to one snapshot, so an edit in between cannot mix two files.
+    """
+    global _knowledge_base
+    file_path = _risks_file_path()
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        logger.error(f"--- [ERROR] risks.md not found at {file_path} ---")
+        return KnowledgeBase(None, [], KeywordMatcher([]))
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    knowledge_base = _knowledge_base  # Read once: the global may be swapped by another thread
+    if signature == knowledge_base.signature:
+        return knowledge_base
+
+    with _knowledge_base_lock:
+        if signature == _knowledge_base.signature:
+            return _knowledge_base
+
+        logger.info("--- [Risk DB] Loading knowledge base... ---")
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                risks = parse_risk_knowledge_base(f.read())
+        except Exception as e:
+            logger.error(f"--- [ERROR] Failed to parse risks.md: {e} ---")
+            risks = []
+
+        matcher = KeywordMatcher(
+            (keyword, risk_position) for risk_position, risk in enumerate(risks) for keyword in risk['keyword_list']
+        )
+        _knowledge_base = KnowledgeBase(signature, risks, matcher)
+        logger.info(f"--- [Risk DB] Loaded {len(risks)} risks. ---")
+        return _knowledge_base
+
+
+def load_risk_knowledge_base():
+    """
+    Returns risks.md as a list of risk objects.
+    Cached, and re-parsed automatically when the file's mtime or size changes.
+    """
+    return load_knowledge_base().risks
+
+
+def find_risk_keywords(loan_text, knowledge_base=None):
+    """
+    Scans the loan text once for every keyword of every risk.
+    Returns (risks, hits) where hits maps risk position -> [{"keyword", "start", "end"}] (offsets into loan_text).
+    knowledge_base defaults to the current snapshot.
+    """
+    knowledge_base = knowledge_base or load_knowledge_base()
+    hits = {}
+    for start, end, keyword, risk_position in knowledge_base.matcher.find_all(fold_case(loan_text)):
+        hits.setdefault(risk_position, []).append({"keyword": keyword, "start": start, "end": end})
+    return knowledge_base.risks, hits
+
+
+def risk_definition_hash(risk):
+    # Changes when a risk's name, definition or keywords are edited in risks.md
+    definition = {key: risk.get(key) for key in ('name', 'description', 'harmful', 'keyword_list')}
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def analysis_version():
+    """Identifies everything besides the text and the risk that shapes a verdict: model and prompt settings."""
+    return f"{LOCAL_LLM_MODEL}:prompt-v{RISK_PROMPT_VERSION}:budget-{RISK_PROMPT_TOKEN_BUDGET}:clause-{RISK_CLAUSE_MAX_CHARS}"
+
+
+def short_text_report(risks):
+    # Empty report returned when the text is too short to analyze
+    return [
+        {"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": "Text too short."}
+        for risk in risks
+    ]
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def clause_window(loan_text, start, end, max_chars=RISK_CLAUSE_MAX_CHARS):
+    """Expands a keyword hit to the sentence around it, at most max_chars either side."""
+    floor = max(0, start - max_chars)
+    window_start = floor
+    for boundary in SENTENCE_BOUNDARY.finditer(loan_text, floor, start):
+        window_start = boundary.end()
+
+    ceiling = min(len(loan_text), end + max_chars)
+    boundary = SENTENCE_BOUNDARY.search(loan_text, end, ceiling)
+    window_end = boundary.end() if boundary else ceiling
+    return window_start, window_end
+
+
+def build_clause_excerpt(loan_text, hits, token_budget=RISK_PROMPT_TOKEN_BUDGET):
+    """
+    Returns the part of the loan text worth sending for one risk: the clauses around its
+    keyword hits, merged where they overlap and capped at token_budget.
+    Short loans that already fit the budget are sent whole.
+    """
+    if estimate_tokens(loan_text) <= token_budget:
+        return loan_text
+
+    windows = sorted(clause_window(loan_text, hit['start'], hit['end']) for hit in hits)
+    merged = []
+    for start, end in windows:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    # Keep clauses in document order until the budget runs out
+    remaining = token_budget * CHARS_PER_TOKEN
+    excerpts = []
+    for start, end in merged:
+        if remaining <= 0:
+            break
+        excerpt = loan_text[start:end].strip()[:remaining]
+        excerpts.append(excerpt)
+        remaining -= len(excerpt) + len(EXCERPT_SEPARATOR)
+    return EXCERPT_SEPARATOR.join(excerpts)
+
+
+def build_risk_prompt(risk, loan_text):
+    return f"""
+You are a senior loan analysis expert. Your task is to find one specific risk in the provided loan agreement.
+You MUST respond in a valid JSON format.
+
+**The Risk to Find:** {risk['name']}
+**Definition:** {risk.get('description', 'N/A')}
+
+**The Loan Agreement (Excerpt with potential keywords):**
+---
+{loan_text}
+---
+
+**Your Task:**
+Carefully read the agreement. Confirm if the risk defined above is truly present. Respond using the following JSON structure.
+- If the risk **IS FOUND**: set "found" to true, "clause_text" to the EXACT quote, and "analysis" to your brief analysis.
+- If the risk **IS NOT FOUND** (e.g., the keyword is used in a safe context): set "found" to false, "clause_text" to an empty string (""), and "analysis" to an empty string ("").
+
+**JSON Response Template (DO NOT ADD ANY TEXT OUTSIDE THE BRACES):**
+{{
+  "found": <true_or_false>,
+  "risk_name": "{risk['name']}",
+  "clause_text": "<quote_or_empty_string>",
+  "analysis": "<analysis_or_empty_string>"
+}}
+"""
+
+
+def parse_risk_response(risk, response_text):
+    """Extracts the JSON verdict from the LLM response and overrides false positives."""
+    match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if not match:
+        raise json.JSONDecodeError("No JSON object found in LLM response", response_text, 0)
+
+    return check_false_positive(risk, json.loads(match.group(0)))
+
+
+def check_false_positive(risk, result_json):
+    # Logical Check
+    if result_json.get("found") == True and not result_json.get("clause_text"):
+        logger.warning(f"--- [WARN] False positive detected for {risk['name']}. Overriding to 'false'. ---")
+        result_json["found"] = False
+        result_json["analysis"] = ""
+        result_json["clause_text"] = ""
+    return result_json
+
+
+def build_combined_prompt(risks, loan_text):
+    risk_list = "\n".join(
+        f"{number}. **{risk['name']}:** {risk.get('description', 'N/A')}" for number, risk in enumerate(risks, start=1)
+    )
+    return f"""
+You are a senior loan analysis expert. Your task is to check the provided loan agreement for each of the specific risks listed below.
+You MUST respond in a valid JSON format.
+
+**The Risks to Find:**
+{risk_list}
+
+**The Loan Agreement (Excerpt with potential keywords):**
+---
+{loan_text}
+---
+
+**Your Task:**
+Carefully read the agreement. For EACH risk above, confirm if it is truly present. Respond with a JSON array containing exactly one object per risk, in the same order, using the "risk_name" exactly as written above.
+- If the risk **IS FOUND**: set "found" to true, "clause_text" to the EXACT quote, and "analysis" to your brief analysis.
+- If the risk **IS NOT FOUND** (e.g., the keyword is used in a safe context): set "found" to false, "clause_text" to an empty string (""), and "analysis" to an empty string ("").
+
+**JSON Response Template (DO NOT ADD ANY TEXT OUTSIDE THE BRACKETS):**
+[
+  {{
+    "found": <true_or_false>,
+    "risk_name": "<risk_name>",
+    "clause_text": "<quote_or_empty_string>",
+    "analysis": "<analysis_or_empty_string>"
+  }}
+]
+"""
+
+
+def parse_combined_response(risks, response_text):
+    """
+    Extracts the per-risk verdicts from a combined response.
+    Returns {risk name: verdict} for the risks that came back well-formed; the rest are missing.
+    """
+    match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        entries = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    risks_by_name = {risk['name']: risk for risk in risks}
+    verdicts = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("found"), bool):
+            continue
+        risk = risks_by_name.get(str(entry.get("risk_name", "")).strip())
+        if risk is None or risk['name'] in verdicts:
+            continue
+        entry["risk_name"] = risk['name']
+        verdicts[risk['name']] = check_false_positive(risk, entry)
+    return verdicts
+
+
+def verify_risk(risk, loan_text, use_cache=True, timeout=None):
+    """
+    Asks the LLM to confirm one keyword-triggered risk. Errors are reported in the entry, not raised.
+    timeout (seconds) counts from when this call starts, so time spent queued for a worker is free.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    response_text = ""
+    try:
+        response_text = call_local_llm(build_risk_prompt(risk, loan_text), use_cache=use_cache, deadline=deadline)
+        return parse_risk_response(risk, response_text)
+    except LLMTimeout:
+        logger.error(f"--- [ERROR] LLM verification timed out for risk {risk['name']} ---")
+        return {"found": False, "risk_name": risk['name'], "error": f"Timed out after {timeout}s."}
+    except json.JSONDecodeError:
+        logger.error(f"--- [ERROR] LLM returned invalid JSON for risk: {risk['name']} ---")
+        logger.error(f"Raw Response was: {response_text}")
+        return {"found": False, "risk_name": risk['name'], "error": "AI response was not valid JSON."}
+    except Exception as e:
+        logger.error(f"--- [ERROR] Local LLM call failed for risk {risk['name']}: {e} ---")
+        return {"found": False, "risk_name": risk['name'], "error": str(e)}
+
+
+# Shared by every request, so RISK_LLM_MAX_WORKERS bounds the calls in flight per process
+_verification_executor = None
+_verification_executor_lock = threading.Lock()
+
+
+def _get_verification_executor():
+    global _verification_executor
+    with _verification_executor_lock:
+        if _verification_executor is None:
+            _verification_executor = ThreadPoolExecutor(max_workers=RISK_LLM_MAX_WORKERS, thread_name_prefix='risk-llm')
+        return _verification_executor
+
+
+def _verify_each(triggered, loan_text, use_cache=True):
+    """
+    Verifies (position, risk, hits) entries one prompt per risk, concurrently.
+    Returns ({position: verdict}, prompt tokens sent).
+    """
+    executor = _get_verification_executor()
+    pending = []
+    sent_tokens = 0
+    for position, risk, hits in triggered:
+        excerpt = build_clause_excerpt(loan_text, hits)
+        sent_tokens += estimate_tokens(build_risk_prompt(risk, excerpt))
+        pending.append((position, executor.submit(verify_risk, risk, excerpt, use_cache, RISK_LLM_TIMEOUT)))
+
+    # No wait bound here: each verification stops its own LLM call RISK_LLM_TIMEOUT after it starts
+    # and reports the timeout in its verdict, so nothing abandoned keeps holding a worker
+    verdicts = {position: future.result() for position, future in pending}
+    return verdicts, sent_tokens
+
+
+def _verify_combined(triggered, loan_text, log_tag, use_cache=True):
+    """
+    Verifies every triggered risk in a single prompt. Risks missing from the response or
+    returned malformed are re-run one prompt per risk.
+    Returns ({position: verdict}, prompt tokens sent, number of risks re-run).
+    """
+    risks = [risk for _, risk, _ in triggered]
+    all_hits = [hit for _, _, hits in triggered for hit in hits]
+    excerpt = build_clause_excerpt(loan_text, all_hits, token_budget=RISK_PROMPT_TOKEN_BUDGET * len(triggered))
+    prompt = build_combined_prompt(risks, excerpt)
+    sent_tokens = estimate_tokens(prompt)
+
+    response_text = ""
+    try:
+        response_text = call_local_llm(prompt, use_cache=use_cache, deadline=time.monotonic() + RISK_LLM_TIMEOUT)
+    except Exception as e:
+        logger.error(f"--- [ERROR] Combined LLM call failed: {e} ---")
+    parsed = parse_combined_response(risks, response_text)
+
+    verdicts = {}
+    retry = []
+    for position, risk, hits in triggered:
+        if risk['name'] in parsed:
+            verdicts[position] = parsed[risk['name']]
+        else:
+            retry.append((position, risk, hits))
+
+    if retry:
+        logger.warning(f"--- [{log_tag}] Combined response unusable for {len(retry)} of {len(triggered)} risks. Re-running them one by one. ---")
+        retried, retry_tokens = _verify_each(retry, loan_text, use_cache)
+        verdicts.update(retried)
+        sent_tokens += retry_tokens
+    return verdicts, sent_tokens, len(retry)
+
+
+def analyze_loan_text(loan_text, log_tag="Interceptor", mode=MODE_PER_RISK, use_cache=True, risk_names=None, knowledge_base=None):
+    """
+    Runs the Risk Interceptor over a loan text.
+    Returns (report, prompt_stats): one report entry per risk in knowledge-base order, and
+    the prompt tokens sent versus what whole-document prompts would have cost.
+    Only risks with a keyword hit are sent to the LLM, with just the clauses around the hits:
+    one prompt per risk in 'per_risk' mode, or a single prompt for all of them in 'combined' mode.
+    risk_names optionally limits the analysis (and the report) to those risks.
+    knowledge_base pins the KnowledgeBase snapshot the caller already works from (default: the current one).
+    """
+    risks, keyword_hits = find_risk_keywords(loan_text, knowledge_base)
+    final_report = []
+    triggered = []  # (report position, risk, hits)
+    full_tokens = 0
+
+    for risk_position, risk in enumerate(risks):
+        if risk_names is not None and risk['name'] not in risk_names:
+            continue
+        hits = keyword_hits.get(risk_position)
+        if not hits:
+            logger.info(f"--- [{log_tag}] No keywords found for {risk['name']}. Skipping LLM call. ---")
+            final_report.append({"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": ""})
+            continue
+
+        # --- IF WE ARE HERE, A KEYWORD WAS FOUND. NOW WE VERIFY WITH THE LLM. ---
+        logger.info(f"--- [{log_tag}] Keyword '{hits[0]['keyword']}' found for risk: {risk['name']}. Sending to LLM. ---")
+        full_tokens += estimate_tokens(build_risk_prompt(risk, loan_text))
+        triggered.append((len(final_report), risk, hits))
+        final_report.append(None)  # Filled in below, keeping knowledge-base order
+
+    retried = 0
+    if not triggered:
+        verdicts, sent_tokens, llm_calls = {}, 0, 0
+    elif mode == MODE_COMBINED:
+        verdicts, sent_tokens, retried = _verify_combined(triggered, loan_text, log_tag, use_cache)
+        llm_calls = 1 + retried
+    else:
+        verdicts, sent_tokens = _verify_each(triggered, loan_text, use_cache)
+        llm_calls = len(triggered)
+
+    for position, risk, hits in triggered:
+        verdicts[position]["risk_name"] = risk['name']  # Canonical name, whatever the model echoed
+        verdicts[position]["keyword_hits"] = hits
+        final_report[position] = verdicts[position]
+
+    prompt_stats = {
+        "mode": mode,
+        "llm_calls": llm_calls,
+        "retried_risks": retried,
+        "full_prompt_tokens": full_tokens,
+        "sent_prompt_tokens": sent_tokens,
+        "saved_tokens": full_tokens - sent_tokens,
+        "saved_percent": round(100.0 * (full_tokens - sent_tokens) / full_tokens, 1) if full_tokens else 0.0,
+    }
+    logger.info(f"--- [{log_tag}] Prompt tokens ({mode}): {sent_tokens} sent vs {full_tokens} for whole-document prompts ({prompt_stats['saved_percent']}% saved) ---")
+    return final_report, prompt_stats
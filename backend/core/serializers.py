@@ -1,15 +1,47 @@
 from rest_framework import serializers
-from .models import Document, ChatSession, ChatMessage, DocumentChunk
+from .models import Document, ChatSession, ChatMessage, DocumentChunk, RiskScanItem, RiskScanJob
 
 # Serializers for converting model instances to JSON and vice versa
 
+
+def projected_fields(request, serializer_class):
+    """
+    Field names requested with ?fields=a,b (e.g. metadata-only listings), or None for all fields.
+    Raises ValidationError for names the serializer does not have.
+    """
+    raw = request.query_params.get('fields') if request is not None else None
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(serializer_class().fields))
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return fields
+
+
+# Serializers mix this in to honour ?fields=
+class ProjectedFieldsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = projected_fields(self.context.get('request'), type(self))
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 # Main document serializer with all fields included
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(ProjectedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Document
         fields = '__all__'
 
 
+# Minimal serializer for polling a document's processing status
+class DocumentStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Document
+        fields = ['id', 'processing_status', 'processing_error', 'updated_at']
+
+
 # Serializes individual chat messages within a session
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,17 +49,61 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'question', 'answer', 'created_at']
 
 
+def session_messages(session):
+    # Oldest first. Views prefetch the newest messages (optionally capped) into latest_messages.
+    if hasattr(session, 'latest_messages'):
+        return list(reversed(session.latest_messages))
+    return session.messages.order_by('created_at', 'id')
+
+
 # Chat session serializer that includes nested messages
 class ChatSessionSerializer(serializers.ModelSerializer):
-    messages = ChatMessageSerializer(many=True, read_only=True)  # Nested message serialization
+    messages = serializers.SerializerMethodField()  # Nested message serialization
+    message_count = serializers.IntegerField(read_only=True)  # All messages, even when 'messages' is capped
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'document', 'created_at', 'message_count', 'messages']
+
+    def get_messages(self, session):
+        return ChatMessageSerializer(session_messages(session), many=True).data
+
+
+# A document's chat history entry: one session with its messages
+class ChatHistorySessionSerializer(serializers.ModelSerializer):
+    session_id = serializers.IntegerField(source='id')
+    message_count = serializers.IntegerField(read_only=True)
+    messages = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatSession
-        fields = ['id', 'document', 'created_at', 'messages']
+        fields = ['session_id', 'created_at', 'message_count', 'messages']
+
+    def get_messages(self, session):
+        return [
+            {"question": message.question, "answer": message.answer, "created_at": message.created_at}
+            for message in session_messages(session)
+        ]
 
 
 # Serializes document chunks with their page and content info
-class DocumentChunkSerializer(serializers.ModelSerializer):
+class DocumentChunkSerializer(ProjectedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = DocumentChunk
         fields = ['chunk_index', 'page_number', 'content']
+
+
+# Per-document outcome within a batch risk scan
+class RiskScanItemSerializer(serializers.ModelSerializer):
+    document_title = serializers.CharField(source='document.title', read_only=True, default=None)
+
+    class Meta:
+        model = RiskScanItem
+        fields = ['document', 'document_title', 'status', 'found_risks', 'error', 'updated_at']
+
+
+# Batch risk scan job; the view adds progress and aggregated risk counts
+class RiskScanJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RiskScanJob
+        fields = ['id', 'status', 'mode', 'document_count', 'created_at', 'updated_at', 'finished_at']
@@ -1,3 +1,264 @@
-from django.test import TestCase
+import random
+import time
+from datetime import timedelta
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .answer_cache import SemanticAnswerCache
+from .llm_client import LLMClient, LLMTimeout, LLMUnavailable
+from .models import ChatMessage, ChatSession, Document
+from .risk_utils import KeywordMatcher, fold_case
+
+
+# Chat history endpoints must cost a fixed number of queries, however many sessions and messages exist
+class ChatHistoryQueryTests(TestCase):
+    SESSIONS = 5
+    MESSAGES_PER_SESSION = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.document = Document.objects.create(title='loan.pdf', file='documents/loan.pdf')
+        for s in range(cls.SESSIONS):
+            session = ChatSession.objects.create(document=cls.document)
+            for m in range(cls.MESSAGES_PER_SESSION):
+                ChatMessage.objects.create(session=session, question=f"q{s}-{m}", answer=f"a{s}-{m}")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def history_url(self):
+        return f'/api/documents/{self.document.id}/chat-history/'
+
+    def test_chat_history_uses_two_queries(self):
+        # Sessions (with message counts) + one prefetch for every session's messages
+        with self.assertNumQueries(2):
+            response = self.client.get(self.history_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.SESSIONS)
+        newest = response.data[0]
+        self.assertEqual(newest['message_count'], self.MESSAGES_PER_SESSION)
+        self.assertEqual([m['question'] for m in newest['messages']], [f"q{self.SESSIONS - 1}-{m}" for m in range(4)])
+
+    def test_messages_limit_keeps_newest_messages_in_order(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.history_url(), {'messages_limit': 2})
+        for session in response.data:
+            self.assertEqual(session['message_count'], self.MESSAGES_PER_SESSION)
+            self.assertEqual([m['question'][-1] for m in session['messages']], ['2', '3'])
+
+    def test_cursor_pagination_walks_all_sessions(self):
+        seen = []
+        url, params = self.history_url(), {'page_size': 2}
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            seen.extend(session['session_id'] for session in response.data['results'])
+            url, params = response.data['next'], None
+        expected = list(ChatSession.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_session_detail_uses_two_queries(self):
+        session = ChatSession.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/sessions/{session.id}/', {'messages_limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message_count'], self.MESSAGES_PER_SESSION)
+        self.assertEqual(len(response.data['messages']), 3)
+
+
+# Document listings: opt-in cursor pages, ?fields= projection and ETag revalidation
+class DocumentListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Document.objects.create(title=f'loan-{i}.pdf', file=f'documents/loan-{i}.pdf')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_unpaginated_list_stays_a_plain_list(self):
+        response = self.client.get('/api/documents/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+
+    def test_cursor_pages_with_projection(self):
+        seen = []
+        url, params = '/api/documents/', {'page_size': 2, 'fields': 'id,title'}
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            for document in response.data['results']:
+                self.assertEqual(set(document), {'id', 'title'})
+                seen.append(document['id'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, list(Document.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/documents/', {'fields': 'id,bogus'}).status_code, 400)
+
+    def test_revalidation_returns_304_until_a_document_changes(self):
+        etag = self.client.get('/api/documents/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/documents/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Document.objects.first().delete()
+        self.assertEqual(self.client.get('/api/documents/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_alone_returns_304_until_a_document_changes(self):
+        # updated_at has microseconds, Last-Modified only whole seconds
+        Document.objects.update(updated_at=timezone.now().replace(microsecond=654321))
+        last_modified = self.client.get('/api/documents/')['Last-Modified']
+        response = self.client.get('/api/documents/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        Document.objects.filter(pk=Document.objects.first().pk).update(updated_at=timezone.now() + timedelta(seconds=2))
+        self.assertEqual(self.client.get('/api/documents/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+
+# Semantic answer cache: threshold, per-document LRU bounds and version invalidation
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def make_cache(self, **kwargs):
+        return SemanticAnswerCache(**{'threshold': 0.9, 'max_entries_per_document': 2, 'max_documents': 2, **kwargs})
+
+    def test_reuses_answer_only_above_threshold(self):
+        cache = self.make_cache()
+        cache.store(1, 'v1', 'what is my interest rate', [1, 0, 0], 'nine percent', [4, 7])
+        entry, similarity = cache.lookup(1, 'v1', [0.95, 0.1, 0])
+        self.assertEqual(entry['answer'], 'nine percent')
+        self.assertGreater(similarity, 0.9)
+        self.assertIsNone(cache.lookup(1, 'v1', [0, 1, 0]))
+        self.assertIsNone(cache.lookup(2, 'v1', [1, 0, 0]))  # Answers never cross documents
+
+    def test_new_version_drops_old_answers(self):
+        cache = self.make_cache()
+        cache.store(1, 'v1', 'q', [1, 0, 0], 'old', [])
+        self.assertIsNone(cache.lookup(1, 'v2', [1, 0, 0]))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_invalidate(self):
+        cache = self.make_cache()
+        cache.store(1, 'v1', 'q', [1, 0, 0], 'a', [])
+        cache.invalidate(1)
+        self.assertIsNone(cache.lookup(1, 'v1', [1, 0, 0]))
+
+    def test_fresh_answer_replaces_equivalent_question(self):
+        cache = self.make_cache()
+        cache.store(1, 'v1', 'q', [1, 0, 0], 'old', [])
+        cache.store(1, 'v1', 'q again', [0.99, 0.05, 0], 'new', [])
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.lookup(1, 'v1', [1, 0, 0])[0]['answer'], 'new')
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_cache()
+        cache.store(1, 'v1', 'a', [1, 0, 0], 'A', [])
+        cache.store(1, 'v1', 'b', [0, 1, 0], 'B', [])
+        cache.lookup(1, 'v1', [1, 0, 0])  # 'a' is now the most recent
+        cache.store(1, 'v1', 'c', [0, 0, 1], 'C', [])
+        self.assertIsNone(cache.lookup(1, 'v1', [0, 1, 0]))
+        self.assertIsNotNone(cache.lookup(1, 'v1', [1, 0, 0]))
+
+        cache.store(2, 'v1', 'a', [1, 0, 0], 'A', [])
+        cache.store(3, 'v1', 'a', [1, 0, 0], 'A', [])  # Document 1 is now the least recently used
+        self.assertEqual(cache.stats()['documents'], 2)
+        self.assertIsNone(cache.lookup(1, 'v1', [1, 0, 0]))
+
+
+# LLM client: circuit breaker states, retries and caller deadlines, against a stubbed session.post
+class LLMClientTests(SimpleTestCase):
+    URL = 'http://llm.test/v1/chat/completions'
+
+    def make_client(self, responses, **kwargs):
+        """responses: one exception (raised) or None (a 200 response) per session.post call."""
+        client = LLMClient([self.URL], **{'max_retries': 0, 'retry_backoff': 0, **kwargs})
+        calls = []
+
+        def post(url, json=None, timeout=None, stream=False):
+            calls.append(timeout)
+            outcome = responses.pop(0)
+            if outcome is not None:
+                raise outcome
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"choices": []}'
+            return response
+
+        client.session.post = post
+        return client, calls
+
+    def test_circuit_opens_after_threshold(self):
+        client, _ = self.make_client([requests.exceptions.ConnectionError()] * 2, failure_threshold=2)
+        breaker = client.breakers[self.URL]
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.post_json({})
+        self.assertIsNone(breaker.opened_at)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.post_json({})
+        self.assertIsNotNone(breaker.opened_at)
+
+    def test_open_circuit_fails_fast(self):
+        client, calls = self.make_client([requests.exceptions.ConnectionError()], failure_threshold=1, reset_timeout=60)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.post_json({})
+        with self.assertRaises(LLMUnavailable) as raised:
+            client.post_json({})
+        self.assertEqual(len(calls), 1)  # The backend was not called again
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    def test_half_open_trial_released_on_non_http_exception(self):
+        client, calls = self.make_client(
+            [requests.exceptions.ConnectionError(), RuntimeError("worker interrupted"), None],
+            failure_threshold=1, reset_timeout=0,
+        )
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.post_json({})
+        with self.assertRaises(RuntimeError):
+            client.post_json({})  # The half-open trial
+        self.assertEqual(client.post_json({}), {"choices": []})  # A new trial is let through and closes the circuit
+        self.assertEqual(len(calls), 3)
+        self.assertIsNone(client.breakers[self.URL].opened_at)
+
+    def test_deadline_raises_llm_timeout(self):
+        client, calls = self.make_client([requests.exceptions.ReadTimeout()], max_retries=2)
+        with self.assertRaises(LLMTimeout):
+            client.post_json({}, deadline=time.monotonic() - 1)
+        self.assertEqual(calls, [])
+
+        with self.assertRaises(LLMTimeout):
+            client.post_json({}, deadline=time.monotonic() + 5)
+        self.assertEqual(len(calls), 1)  # Read timeouts are not retried
+        self.assertLessEqual(calls[0][1], 5)  # The read timeout was capped at the deadline
+        self.assertEqual(client.breakers[self.URL].failures, 0)  # Our deadline, not the backend's fault
+
+
+# Risk keyword matcher: the Aho-Corasick automaton must agree with a plain str.find scan
+class KeywordMatcherTests(SimpleTestCase):
+    @staticmethod
+    def brute_force(keywords, text):
+        hits = []
+        for keyword, payload in keywords:
+            start = text.find(keyword)
+            while start != -1:
+                hits.append((start, start + len(keyword), keyword, payload))
+                start = text.find(keyword, start + 1)
+        return sorted(hits)
+
+    def test_matches_brute_force(self):
+        # Overlapping keywords, prefixes and suffixes of each other, and the same keyword for two risks
+        keywords = [("ab", 0), ("abc", 1), ("bca", 2), ("c", 3), ("aab", 4), ("abc", 5), ("cab ca", 6)]
+        matcher = KeywordMatcher(keywords)
+        rng = random.Random(7)
+        for _ in range(200):
+            text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 60)))
+            self.assertEqual(sorted(matcher.find_all(text)), self.brute_force(keywords, text), text)
+
+    def test_offsets_index_the_original_text(self):
+        # 'İ'.lower() is two characters; fold_case must not shift the offsets after it
+        text = "İİ clause 4: Balloon Payment due at maturity"
+        matcher = KeywordMatcher([(fold_case("balloon payment"), 0)])
+        folded = fold_case(text)
+        self.assertEqual(len(folded), len(text))
+        [(start, end, _, _)] = matcher.find_all(folded)
+        self.assertEqual(text[start:end], "Balloon Payment")
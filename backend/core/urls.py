@@ -6,10 +6,14 @@ from .views import (
     DocumentListView, 
     DocumentDetailView, 
     DocumentDeleteView, 
+    DocumentStatusView,
     ChatSessionDetailView, 
     DocumentChunkListView,
     ask_question, 
+    ask_question_stream,
+    corpus_search,
     chat_history,
+    cache_stats,
     analyze_document_risks
 )
 from django.views.decorators.csrf import csrf_protect
@@ -31,17 +35,26 @@ urlpatterns = [
     path('documents/', DocumentListView.as_view(), name='document-list'),
     path('documents/<int:pk>/', DocumentDetailView.as_view(), name='document-detail'),
     path('documents/<int:pk>/delete/', DocumentDeleteView.as_view(), name='document-delete'),
+    path('documents/<int:pk>/status/', DocumentStatusView.as_view(), name='document-status'),
     path('documents/<int:document_id>/chunks/', DocumentChunkListView.as_view(), name='document-chunks'),
     
     # --- Interceptor Endpoints ---
     path('analyze-risks/', views.analyze_document_risks, name='analyze-risks'), # The demo one
     path('document/<int:document_id>/analyze-risk/', views.analyze_risk_by_id, name='analyze-risk-by-id'), # The production one
+    path('risk-scans/', views.risk_scans, name='risk-scans'),
+    path('risk-scans/<int:pk>/', views.risk_scan_detail, name='risk-scan-detail'),
+    path('risk-scans/<int:pk>/resume/', views.resume_risk_scan, name='risk-scan-resume'),
     
     # Chat functionality
     path('ask/', ask_question, name='ask-question'),
+    path('ask/stream/', ask_question_stream, name='ask-question-stream'),
+    path('search/', corpus_search, name='corpus-search'),
     path('sessions/<int:pk>/', ChatSessionDetailView.as_view(), name='chat-session-detail'),
     path('documents/<int:document_id>/chat-history/', chat_history, name='chat-history'),
     
+    # Cache monitoring
+    path('cache-stats/', cache_stats, name='cache-stats'),
+
     # Security
     path("api/csrf/", csrf_cookie_view), 
     path('csrf/', csrf_token_view),
@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import faiss
+import numpy as np
+
+from .file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_LOCK_NAME = "manifest.lock"
+
+# Storage precisions for chunk vectors. float16 halves memory, int8 quarters it.
+VECTOR_DTYPES = ('float32', 'float16', 'int8')
+# Sentence embeddings are unit-normalized, so every component lies in [-1, 1]
+# and int8 uses one fixed symmetric scale (values outside are clipped).
+INT8_SCALE = 127.0
+
+
+def quantize(vectors, dtype):
+    vectors = np.asarray(vectors, dtype="float32")
+    if dtype == 'int8':
+        return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype("int8")
+    return vectors.astype(dtype)
+
+
+def dequantize(vectors, dtype):
+    if dtype == 'int8':
+        return np.asarray(vectors, dtype="float32") / INT8_SCALE
+    return np.asarray(vectors, dtype="float32")
+
+
+# Persistent on-disk store for per-document chunk embeddings.
+# Every document gets its own raw vector file (row i is the embedding of chunk_index i)
+# and a small JSON manifest records the shape and dtype of each file, so vectors can be
+# memory-mapped after a restart instead of being re-embedded. Web workers and management
+# commands all update the manifest, so its read-modify-write runs under a file lock.
+class VectorStore:
+    def __init__(self, root, dim, dtype='float32'):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {VECTOR_DTYPES}")
+        self.root = str(root)
+        self.dim = dim
+        self.dtype = dtype
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _manifest_lock(self):
+        return file_lock(os.path.join(self.root, MANIFEST_LOCK_NAME))
+
+    def path_for(self, document_id):
+        return os.path.join(self.root, f"doc_{document_id}.vec")
+
+    def read_manifest(self):
+        """
+        Returns the manifest as a dict keyed by document id (as a string).
+        Re-read on every call so vectors written by other workers are picked up.
+        """
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"--- [VectorStore] Could not read manifest: {e} ---")
+            return {}
+
+    def _write_manifest(self, manifest):
+        # Write to a temp file and swap it in so readers never see a half-written manifest
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path())
+
+    def save(self, document_id, vectors):
+        """Writes a document's vectors to disk and records them in the manifest."""
+        with self.writer(document_id) as writer:
+            writer.append(vectors)
+
+    def writer(self, document_id):
+        """Returns a VectorWriter that appends a document's vectors in windows."""
+        return VectorWriter(self, document_id)
+
+    def copy(self, source_id, target_id):
+        """Copies one document's vectors to another document id. Returns False if the source has none."""
+        source = self.load(source_id)
+        entry = self.read_manifest().get(str(source_id))
+        if source is None or entry is None:
+            return False
+        tmp_path = self.path_for(target_id) + ".tmp"
+        shutil.copyfile(os.path.join(self.root, entry["file"]), tmp_path)
+        self._commit(target_id, tmp_path, len(source), entry["dtype"])
+        return True
+
+    def _commit(self, document_id, tmp_path, count, dtype):
+        path = self.path_for(document_id)
+        os.replace(tmp_path, path)
+
+        with self._manifest_lock():
+            manifest = self.read_manifest()
+            manifest[str(document_id)] = {
+                "file": os.path.basename(path),
+                "count": int(count),
+                "dim": self.dim,
+                "dtype": dtype,
+            }
+            self._write_manifest(manifest)
+
+        logger.info(f"--- [VectorStore] Saved {count} vectors for document {document_id} ---")
+
+    def load(self, document_id):
+        """
+        Memory-maps a document's vectors in their stored dtype. Returns None if the
+        document has no vectors on disk or the file does not match its manifest entry.
+        """
+        entry = self.read_manifest().get(str(document_id))
+        if not entry:
+            return None
+
+        path = os.path.join(self.root, entry["file"])
+        count, dim = entry["count"], entry["dim"]
+        expected_size = count * dim * np.dtype(entry["dtype"]).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) != expected_size:
+            logger.warning(f"--- [VectorStore] Vector file for document {document_id} is missing or truncated ---")
+            return None
+        if count == 0:
+            return np.empty((0, dim), dtype=entry["dtype"])
+
+        return np.memmap(path, dtype=entry["dtype"], mode='r', shape=(count, dim))
+
+    def load_float32(self, document_id):
+        """Like load(), but dequantized to a float32 array ready for FAISS."""
+        vectors = self.load(document_id)
+        if vectors is None or vectors.dtype == np.float32:
+            return vectors
+        return dequantize(vectors, vectors.dtype.name)
+
+    def has(self, document_id):
+        return self.load(document_id) is not None
+
+    def delete(self, document_id):
+        """Removes a document's vector file and manifest entry."""
+        with self._manifest_lock():
+            manifest = self.read_manifest()
+            entry = manifest.pop(str(document_id), None)
+            if entry is not None:
+                self._write_manifest(manifest)
+
+        paths = {self.path_for(document_id)}
+        if entry is not None:
+            paths.add(os.path.join(self.root, entry["file"]))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return entry is not None
+
+    def document_ids(self):
+        return [int(doc_id) for doc_id in self.read_manifest().keys()]
+
+
+# Streams a document's vectors to a temp file window by window.
+# The file only replaces the old one (and enters the manifest) when the writer
+# closes cleanly, so a failed ingestion never leaves a half-written document behind.
+class VectorWriter:
+    def __init__(self, store, document_id):
+        self.store = store
+        self.document_id = document_id
+        self.count = 0
+        self._tmp_path = store.path_for(document_id) + ".tmp"
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(self.store.root, exist_ok=True)
+        self._file = open(self._tmp_path, 'wb')
+        return self
+
+    def append(self, vectors):
+        vectors = np.asarray(vectors, dtype="float32").reshape(-1, self.store.dim)
+        np.ascontiguousarray(quantize(vectors, self.store.dtype)).tofile(self._file)
+        self.count += vectors.shape[0]
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return False
+        self.store._commit(self.document_id, self._tmp_path, self.count, self.store.dtype)
+        return False
+
+
+def new_flat_index(dim, dtype='float32'):
+    """
+    Exact L2 index storing vectors at the given precision. float16 and int8 use
+    FAISS scalar quantizers; int8 is trained on the fixed [-1, 1] embedding range
+    so every document shares the same quantization grid.
+    """
+    if dtype == 'float32':
+        return faiss.IndexFlatL2(dim)
+    if dtype == 'float16':
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    if dtype == 'int8':
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        index.train(np.stack([np.full(dim, -1.0), np.full(dim, 1.0)]).astype("float32"))
+        return index
+    raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {VECTOR_DTYPES}")
+
+
+def measure_recall(reference, queries, k, dtype):
+    """
+    Recall@k of a quantized index against exact float32 search over the same vectors:
+    the fraction of the true top-k neighbours the quantized search also returns.
+    The vectors take the same path as after a restart: quantized for the vector store,
+    dequantized on load, then quantized again by the index.
+    """
+    reference = np.ascontiguousarray(reference, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    k = min(k, len(reference))
+    if k == 0 or len(queries) == 0:
+        return 1.0
+
+    exact = faiss.IndexFlatL2(reference.shape[1])
+    exact.add(reference)
+    approx = new_flat_index(reference.shape[1], dtype)
+    approx.add(np.ascontiguousarray(dequantize(quantize(reference, dtype), dtype)))
+
+    _, truth = exact.search(queries, k)
+    _, found = approx.search(queries, k)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / float(truth.size)
+
+
+# In-memory FAISS search keyed by (document_id, chunk_index).
+# Each document gets its own ID-mapped flat index, so a search only scans the
+# target document's vectors and deleting a loan actually frees its memory.
+# With dtype float16/int8 the vectors are held scalar-quantized.
+class DocumentIndex:
+    def __init__(self, dim, dtype='float32'):
+        self.dim = dim
+        self.dtype = dtype
+        self._indexes = {}  # Maps document.id to its faiss.IndexIDMap2
+        self._dirty = set()  # Documents with removed vectors waiting for compaction
+        self._lock = threading.Lock()
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(new_flat_index(self.dim, self.dtype))
+
+    def __contains__(self, document_id):
+        return document_id in self._indexes
+
+    def document_ids(self):
+        return list(self._indexes.keys())
+
+    def count(self, document_id=None):
+        """Number of vectors held for one document, or for all documents."""
+        if document_id is not None:
+            index = self._indexes.get(document_id)
+            return index.ntotal if index is not None else 0
+        return sum(index.ntotal for index in self._indexes.values())
+
+    def add(self, document_id, vectors, chunk_indexes=None):
+        """Adds vectors for a document. Chunk indexes default to 0..n-1 (the row order)."""
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, self.dim)
+        if chunk_indexes is None:
+            chunk_indexes = np.arange(len(vectors))
+        ids = np.ascontiguousarray(chunk_indexes, dtype="int64")
+        if len(ids) != len(vectors):
+            raise ValueError("chunk_indexes and vectors must have the same length")
+
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is None:
+                index = self._indexes[document_id] = self._new_index()
+            if len(vectors):
+                index.add_with_ids(vectors, ids)
+
+    def add_if_absent(self, document_id, vectors):
+        """
+        Installs a document's full vector set (chunk indexes 0..n-1) unless the document is
+        already loaded, so concurrent first loads do not append it twice.
+        Returns the number of vectors held for the document afterwards.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, self.dim)
+        loaded = self._new_index()  # Built outside the lock; only the winner's is published
+        if len(vectors):
+            loaded.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+
+        with self._lock:
+            index = self._indexes.setdefault(document_id, loaded)
+            return index.ntotal
+
+    def search(self, document_id, query, k):
+        """
+        Searches only the given document's vectors.
+        Returns (distances, chunk_indexes) as 1-D arrays, nearest first.
+        """
+        index = self._indexes.get(document_id)
+        if index is None or index.ntotal == 0:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+
+        query = np.ascontiguousarray(query, dtype="float32").reshape(1, self.dim)
+        distances, ids = index.search(query, min(k, index.ntotal))
+        keep = ids[0] != -1
+        return distances[0][keep], ids[0][keep]
+
+    def remove(self, document_id, chunk_indexes=None):
+        """
+        Removes a whole document, or only some of its chunk indexes.
+        Returns the number of vectors removed.
+        """
+        with self._lock:
+            index = self._indexes.get(document_id)
+            if index is None:
+                return 0
+            if chunk_indexes is None:
+                del self._indexes[document_id]
+                self._dirty.discard(document_id)
+                return index.ntotal
+
+            removed = index.remove_ids(np.ascontiguousarray(chunk_indexes, dtype="int64"))
+            if removed:
+                self._dirty.add(document_id)
+            return removed
+
+    def compact(self):
+        """
+        Rebuilds indexes that had vectors removed so their buffers shrink,
+        and drops documents that no longer have any vectors.
+        """
+        with self._lock:
+            for document_id in list(self._dirty):
+                index = self._indexes.get(document_id)
+                if index is None:
+                    continue
+                if index.ntotal == 0:
+                    del self._indexes[document_id]
+                    continue
+
+                ids = faiss.vector_to_array(index.id_map).astype("int64")
+                vectors = index.index.reconstruct_n(0, index.ntotal)
+                fresh = self._new_index()
+                fresh.add_with_ids(vectors, ids)
+                self._indexes[document_id] = fresh
+            self._dirty.clear()
+
+            for document_id in [doc_id for doc_id, index in self._indexes.items() if index.ntotal == 0]:
+                del self._indexes[document_id]
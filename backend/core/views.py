@@ -1,61 +1,52 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
-from rest_framework.decorators import api_view 
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.generics import DestroyAPIView, RetrieveAPIView, ListAPIView
-from .models import Document, Chunk, ChatSession, ChatMessage, DocumentChunk
-# --- This import is now correct and includes extract_text ---
-from .rag_utils import process_document, doc_embeddings_map, model, index, extract_text
-from .serializers import ChatSessionSerializer, DocumentChunkSerializer, DocumentSerializer
-import numpy as np
+from .models import Document, ChatSession, ChatMessage, DocumentChunk, RiskScanJob
+from .rag_utils import (
+    index, get_document_text, retrieve_chunks, vector_store, bm25_index,
+    embedding_cache, file_sha256, find_duplicate_document, clone_document, corpus_index,
+    answer_cache, document_version,
+)
+from .embeddings import encode_texts
+from .llm_client import LLMUnavailable
+from .llm_utils import call_local_llm, llm_cache, stream_local_llm
+from .risk_reports import get_risk_report
+from .risk_utils import ANALYSIS_MODES, RISK_ANALYSIS_MODE, analyze_loan_text, load_risk_knowledge_base, short_text_report
+from .ingestion import QueueFull, enqueue_document, ingestion_queue
+from .risk_scans import create_scan, resume_scan, risk_scan_runner, scan_summary
+from .conditional import ConditionalListMixin
+from .pagination import (
+    ChatSessionCursorPagination, ChunkCursorPagination, DocumentCursorPagination, OptInCursorPaginationMixin,
+    pagination_requested,
+)
+from .serializers import (
+    ChatHistorySessionSerializer, ChatSessionSerializer, DocumentChunkSerializer, DocumentSerializer, DocumentStatusSerializer,
+    RiskScanItemSerializer, RiskScanJobSerializer, projected_fields,
+)
+import json
 import os
 import requests
 from django.views.decorators.csrf import ensure_csrf_cookie
 import logging
 # --- All Gemini code is GONE ---
-import json
-import re
-import functools
-from django.http import JsonResponse
-from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Max, Prefetch
 
 logger = logging.getLogger(__name__)
 
-LOCAL_LLM_URL = "http://localhost:1234/v1/chat/completions"
 
-def call_local_llm(prompt):
-    """
-    Helper function to call the local LLM (Mistral)
-    Assumes an OpenAI-compatible API endpoint.
-    """
-    try:
-        payload = {
-            "model": "mistral-local", # This name is often a placeholder for local servers
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.0, # Set to 0.0 for maximum determinism
-            "stream": False
-        }
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(LOCAL_LLM_URL, json=payload, headers=headers, timeout=120) 
-        response.raise_for_status() 
-
-        json_response = response.json()
-        content = json_response['choices'][0]['message']['content']
-        return content.strip()
-
-    except requests.exceptions.ConnectionError:
-        logger.error(f"--- [LLM ERROR] Connection refused. Is the local server running at {LOCAL_LLM_URL}? ---")
-        raise Exception(f"ConnectionError: Cannot connect to local LLM at {LOCAL_LLM_URL}.")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"--- [LLM ERROR] Request failed: {str(e)} ---")
-        raise Exception(f"RequestException: {str(e)}")
-    except (KeyError, IndexError) as e:
-            logger.error(f"--- [LLM ERROR] Unexpected JSON response format from local LLM: {response.text} ---")
-            raise Exception(f"JSONParseError: Invalid response format from LLM. {e}")
-# --- END NEW HELPER FUNCTION ---
+def request_flag(request, name, default=True):
+    # JSON bodies send booleans; form posts and query strings send strings
+    value = request.data.get(name, request.query_params.get(name, default))
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', 'off', '')
+    return bool(value)
 
 
 # -----------------------------------------------------------------
@@ -63,16 +54,28 @@ def call_local_llm(prompt):
 # -----------------------------------------------------------------
 
 # List all documents, ordered by creation date
-class DocumentListView(ListAPIView):
-    queryset = Document.objects.all().order_by('-created_at')
+# ?fields= projects (e.g. metadata only), ?page_size / ?cursor paginate, unchanged lists answer 304
+class DocumentListView(OptInCursorPaginationMixin, ConditionalListMixin, ListAPIView):
     serializer_class = DocumentSerializer
+    pagination_class = DocumentCursorPagination
+
+    def get_queryset(self):
+        queryset = Document.objects.all().order_by('-created_at', '-id')
+        fields = projected_fields(self.request, DocumentSerializer)
+        if fields:
+            queryset = queryset.only(*fields, 'created_at')  # Also the pagination cursor's column
+        return queryset
+
+    def get_list_version(self):
+        stats = Document.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        return stats['last_modified'], str(stats['count'])
 
 # Retrieve single document details
 class DocumentDetailView(RetrieveAPIView):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
 
-# Handle document upload and processing
+# Handle document upload; processing runs on the background ingestion queue
 @method_decorator(ensure_csrf_cookie, name='dispatch')
 class DocumentUploadView(APIView):
     parser_classes = [MultiPartParser]
@@ -84,21 +87,66 @@ class DocumentUploadView(APIView):
 
         serializer = DocumentSerializer(data={'file': file, 'title': file.name})
         if serializer.is_valid():
-            document = serializer.save()
+            content_hash = file_sha256(file)
+            document = serializer.save(content_hash=content_hash)
+
+            # Identical file already processed: reuse its chunks and vectors instead of re-embedding
+            # (without stored vectors it is queued like any upload, reusing the extracted text)
+            source = find_duplicate_document(content_hash, exclude_id=document.id)
+            if source is not None:
+                try:
+                    if clone_document(source, document):
+                        return Response({
+                            'message': 'Document uploaded; identical file already processed',
+                            'id': document.id,
+                            'title': document.title,
+                            'processing_status': document.processing_status,
+                            'duplicate_of': source.id,
+                        }, status=status.HTTP_200_OK)
+                except Exception as e:
+                    logger.error(f"Could not reuse document {source.id} for {document.id}, processing normally: {str(e)}")
+
             try:
-                process_document(document)  # Process document for RAG
-                logger.info(f"Document {document.id} processed successfully")
-                return Response({
-                    'message': 'Document uploaded and processed successfully',
-                    'id': document.id,
-                    'title': document.title,
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                logger.error(f"Error processing document {document.id}: {str(e)}")
-                document.delete()  # Clean up if processing fails
-                return Response({'error': f'Document processing failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                enqueue_document(document)
+            except QueueFull as e:
+                logger.warning(f"Rejected upload of {document.title}: {str(e)}")
+                document.file.delete(save=False)
+                document.delete()
+                return Response(
+                    {'error': 'Too many documents are being processed. Please retry shortly.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '30'},
+                )
+
+            document.refresh_from_db(fields=['processing_status', 'processing_error'])
+            logger.info(f"Document {document.id} queued for processing")
+            return Response({
+                'message': 'Document uploaded and queued for processing',
+                'id': document.id,
+                'title': document.title,
+                'processing_status': document.processing_status,
+            }, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Lightweight processing status for polling after an upload
+class DocumentStatusView(RetrieveAPIView):
+    queryset = Document.objects.only('id', 'processing_status', 'processing_error', 'updated_at')
+    serializer_class = DocumentStatusSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response.data['queue_depth'] = ingestion_queue.depth()
+        return response
+
+# Hit/miss counters for the embedding and LLM response caches, used to size them
+@api_view(['GET'])
+def cache_stats(request):
+    return Response({
+        "embedding_cache": embedding_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+    })
+
 # Delete document and clean up associated resources
 class DocumentDeleteView(DestroyAPIView):
     queryset = Document.objects.all()
@@ -109,21 +157,19 @@ class DocumentDeleteView(DestroyAPIView):
             document = Document.objects.get(id=doc_id)
             
             # Clean up chunks and file
-            Chunk.objects.filter(document=document).delete()
             DocumentChunk.objects.filter(document=document).delete()
             
             if document.file and os.path.exists(document.file.path):
                 os.remove(document.file.path)
             
-            # Remove from embeddings map but don't reset entire index
-            if doc_id in doc_embeddings_map:
-                del doc_embeddings_map[doc_id]
-                logger.info(f"Removed embeddings for document {doc_id}")
-            
-            # Only reset index if no documents remain
-            if not doc_embeddings_map:
-                index.reset()
-                logger.info("Reset FAISS index as no documents remain")
+            # Remove persisted vectors and free this document's slice of the index
+            corpus_index.remove_document(doc_id)
+            answer_cache.invalidate(int(doc_id))
+            vector_store.delete(doc_id)
+            bm25_index.remove(doc_id)
+            removed = index.remove(doc_id)
+            index.compact()
+            logger.info(f"Removed {removed} vectors for document {doc_id}")
 
             document.delete()
             return Response({"message": f"Document {doc_id} and all associated data deleted."})
@@ -137,7 +183,60 @@ class DocumentDeleteView(DestroyAPIView):
 #  YOUR FUNCTION-BASED VIEWS (RAG CHAT + INTERCEPTOR)
 # -----------------------------------------------------------------
 
+def build_answer_prompt(question, matched_chunks):
+    # Prepare context from matched chunks
+    context = "\n\n".join([f"Chunk {i+1}:\n{chunk}" for i, chunk in enumerate(matched_chunks)])
+    
+    # Create improved prompt
+    return f"""You are an AI assistant helping users understand a document. Use the provided context to answer the question accurately and concisely.
+
+Context from the document:
+{context}
+
+Question: {question}
+
+Instructions:
+- Base your answer primarily on the provided context
+- If the context doesn't contain enough information, clearly state what information is missing
+- Be specific and cite relevant parts of the context when possible
+- Keep your answer focused and relevant to the question
+- Provide a detailed and helpful answer
+
+Answer:"""
+
+
+def save_chat_message(document_id, session_id, question, answer):
+    """Appends a Q&A pair to the given chat session, or to a new one if it does not exist."""
+    if session_id:
+        try:
+            session = ChatSession.objects.get(id=session_id, document_id=document_id)
+        except ChatSession.DoesNotExist:
+            session = ChatSession.objects.create(document_id=document_id)
+    else:
+        session = ChatSession.objects.create(document_id=document_id)
+
+    # Save the chat message
+    ChatMessage.objects.create(
+        session=session,
+        question=question,
+        answer=answer
+    )
+    return session
+
+
+def cached_answer(document_id, question_embedding, use_cache):
+    """
+    Returns (version, hit): the document version to store a fresh answer under and, when a
+    semantically equivalent question was already answered for this version, (entry, similarity).
+    """
+    version = document_version(document_id)
+    if not use_cache or version is None:
+        return version, None
+    return version, answer_cache.lookup(document_id, version, question_embedding[0])
+
+
 # Handle Q&A with RAG implementation
+# Repeated questions (same meaning, any phrasing) are answered from answer_cache: "cached": true
 @api_view(['POST'])
 def ask_question(request):
     try:
@@ -152,99 +251,60 @@ def ask_question(request):
     except (TypeError, ValueError):
         return Response({"error": "Invalid or missing document_id/question"}, status=400)
 
-    # Check if document exists in embeddings map
-    if document_id not in doc_embeddings_map:
-        logger.error(f"Document {document_id} embeddings not found in memory")
-        return Response({"error": "Document embeddings not found in memory. Try re-uploading the document."}, status=500)
-
     try:
-        # Get document data
-        doc_data = doc_embeddings_map[document_id]
-        chunks = doc_data.get("chunks", [])
-        
-        if not chunks:
+        use_cache = request_flag(request, 'use_cache')
+        question_embedding = encode_texts([question])
+        version, hit = cached_answer(document_id, question_embedding, use_cache)
+        if hit is not None:
+            entry, similarity = hit
+            logger.info(f"--- [Answer Cache] Reusing the answer to '{entry['question'][:50]}' (similarity {similarity:.3f}) ---")
+            session = save_chat_message(document_id, request.data.get("session_id"), question, entry["answer"])
+            return Response({
+                "answer": entry["answer"],
+                "session_id": session.id,
+                "highlight_indexes": entry["highlight_indexes"],
+                "chunks_used": len(entry["highlight_indexes"]),
+                "cached": True,
+                "similarity": round(similarity, 4),
+            })
+
+        # Hybrid vector + keyword retrieval; vectors are reloaded from disk after a restart
+        retrieved = retrieve_chunks(document_id, question, question_embedding=question_embedding)
+        if retrieved is None:
+            logger.error(f"Document {document_id} embeddings not found in memory or vector store")
+            return Response({"error": "Document embeddings not found. Run 'manage.py rebuild_vectors' or re-upload the document."}, status=500)
+
+        highlight_indexes, matched_chunks = retrieved
+        if not matched_chunks:
             logger.error(f"No chunks found for document {document_id}")
             return Response({"error": "No content chunks found for this document."}, status=500)
         
-        logger.info(f"Found {len(chunks)} chunks for document {document_id}")
-        
-        # Generate question embedding
-        question_embedding = model.encode(question)
-        question_embedding = np.array([question_embedding]).astype("float32")
-        
-        # Search for similar chunks
-        k = min(5, len(chunks))  # Don't search for more chunks than available
-        D, I = index.search(question_embedding, k=k)
-        
-        # Get matched chunks and their indices
-        matched_chunks = []
-        highlight_indexes = []
-        
-        for i, (distance, chunk_idx) in enumerate(zip(D[0], I[0])):
-            if chunk_idx < len(chunks) and distance < 1.5:  # Distance threshold
-                matched_chunks.append(chunks[chunk_idx])
-                highlight_indexes.append(int(chunk_idx))  # Convert to int for JSON serialization
-                logger.info(f"Match {i+1}: chunk {chunk_idx}, distance: {distance:.4f}")
-        
-        if not matched_chunks:
-            logger.warning(f"No relevant chunks found for question: {question[:50]}...")
-            # Fallback to first few chunks
-            matched_chunks = chunks[:3]
-            highlight_indexes = [0, 1, 2] if len(chunks) >= 3 else list(range(len(chunks)))
-        
-        # Prepare context from matched chunks
-        context = "\n\n".join([f"Chunk {i+1}:\n{chunk}" for i, chunk in enumerate(matched_chunks)])
-        
-        # Create improved prompt
-        prompt = f"""You are an AI assistant helping users understand a document. Use the provided context to answer the question accurately and concisely.
-
-Context from the document:
-{context}
-
-Question: {question}
-
-Instructions:
-- Base your answer primarily on the provided context
-- If the context doesn't contain enough information, clearly state what information is missing
-- Be specific and cite relevant parts of the context when possible
-- Keep your answer focused and relevant to the question
-- Provide a detailed and helpful answer
-
-Answer:"""
-
-        logger.info(f"Sending request to Local LLM with context length: {len(context)}")
+        prompt = build_answer_prompt(question, matched_chunks)
+        logger.info(f"Sending request to Local LLM with prompt length: {len(prompt)}")
         
         # --- Get response from Local LLM ---
         try:
-            answer = call_local_llm(prompt)
+            answer = call_local_llm(prompt, use_cache=use_cache)
             logger.info(f"Generated answer length: {len(answer)}")
+        except LLMUnavailable as e:
+            return Response({"error": f"LLM Error: {str(e)}"}, status=503,
+                            headers={'Retry-After': str(max(1, int(e.retry_after)))})
         except Exception as e:
             logger.error(f"Local LLM error in ask_question: {str(e)}")
             # Return the specific error message from the helper
             return Response({"error": f"LLM Error: {str(e)}"}, status=500)
 
         # Create or get chat session and save message
-        session_id = request.data.get("session_id")
-        if session_id:
-            try:
-                session = ChatSession.objects.get(id=session_id, document_id=document_id)
-            except ChatSession.DoesNotExist:
-                session = ChatSession.objects.create(document_id=document_id)
-        else:
-            session = ChatSession.objects.create(document_id=document_id)
-
-        # Save the chat message
-        ChatMessage.objects.create(
-            session=session,
-            question=question,  
-            answer=answer
-        )
+        session = save_chat_message(document_id, request.data.get("session_id"), question, answer)
+        if version is not None:
+            answer_cache.store(document_id, version, question, question_embedding[0], answer, highlight_indexes)
 
         return Response({
             "answer": answer,
             "session_id": session.id,
             "highlight_indexes": highlight_indexes,  # Include highlight indexes
-            "chunks_used": len(matched_chunks)
+            "chunks_used": len(matched_chunks),
+            "cached": False,
         })
 
     except requests.exceptions.RequestException as e:
@@ -254,95 +314,220 @@ Answer:"""
         logger.error(f"Unexpected error in ask_question: {str(e)}")
         return Response({"error": f"Unexpected error: {str(e)}"}, status=500)
 
+def sse_event(data, event=None):
+    # One server-sent event: optional event name, JSON payload, blank-line terminator
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients send 'Accept: text/event-stream'; error responses become an SSE error event."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event(data, event="error").encode('utf-8')
+
+
+# Same as ask_question, but streams the answer as server-sent events while it is generated:
+#   event: meta   {"highlight_indexes": [...], "chunks_used": n, "cached": bool}   (before generation starts)
+#   data:         {"token": "..."}                                   (one per generated piece)
+#   event: done   {"session_id": n, "answer": "..."}                 (after the message is saved)
+#   event: error  {"error": "..."}
+@api_view(['POST'])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def ask_question_stream(request):
+    try:
+        document_id = int(request.data.get("document_id"))
+        question = request.data.get("question")
+
+        if not question or not question.strip():
+            return Response({"error": "Question cannot be empty"}, status=400)
+
+        logger.info(f"Streaming answer for document {document_id}: {question[:100]}...")
+
+    except (TypeError, ValueError):
+        return Response({"error": "Invalid or missing document_id/question"}, status=400)
+
+    use_cache = request_flag(request, 'use_cache')
+    session_id = request.data.get("session_id")
+    try:
+        question_embedding = encode_texts([question])
+        version, hit = cached_answer(document_id, question_embedding, use_cache)
+        if hit is not None:
+            return stream_cached_answer(document_id, session_id, question, *hit)
+        retrieved = retrieve_chunks(document_id, question, question_embedding=question_embedding)
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_question_stream: {str(e)}")
+        return Response({"error": f"Unexpected error: {str(e)}"}, status=500)
+    if retrieved is None:
+        return Response({"error": "Document embeddings not found. Run 'manage.py rebuild_vectors' or re-upload the document."}, status=500)
+    highlight_indexes, matched_chunks = retrieved
+    if not matched_chunks:
+        return Response({"error": "No content chunks found for this document."}, status=500)
+
+    prompt = build_answer_prompt(question, matched_chunks)
+
+    def events():
+        yield sse_event({"highlight_indexes": highlight_indexes, "chunks_used": len(matched_chunks), "cached": False}, event="meta")
+
+        parts = []
+        tokens = stream_local_llm(prompt, use_cache=use_cache)
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse_event({"token": token})
+        except GeneratorExit:
+            # Client went away mid-answer: stop generating and keep the partial answer out of the history
+            logger.info(f"--- [Stream] Client disconnected after {len(parts)} tokens; answer not saved ---")
+            raise
+        except LLMUnavailable as e:
+            yield sse_event({"error": f"LLM Error: {str(e)}", "retry_after": e.retry_after}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Local LLM error in ask_question_stream: {str(e)}")
+            yield sse_event({"error": f"LLM Error: {str(e)}"}, event="error")
+            return
+        finally:
+            tokens.close()
+
+        answer = "".join(parts).strip()
+        session = save_chat_message(document_id, session_id, question, answer)
+        if version is not None:
+            answer_cache.store(document_id, version, question, question_embedding[0], answer, highlight_indexes)
+        logger.info(f"Streamed answer length: {len(answer)}")
+        yield sse_event({"session_id": session.id, "answer": answer}, event="done")
+
+    return event_stream_response(events())
+
+
+def stream_cached_answer(document_id, session_id, question, entry, similarity):
+    # Same events as a generated answer, with the whole cached answer as a single token
+    logger.info(f"--- [Answer Cache] Reusing the answer to '{entry['question'][:50]}' (similarity {similarity:.3f}) ---")
+
+    def events():
+        highlight_indexes = entry["highlight_indexes"]
+        yield sse_event({"highlight_indexes": highlight_indexes, "chunks_used": len(highlight_indexes), "cached": True}, event="meta")
+        yield sse_event({"token": entry["answer"]})
+        session = save_chat_message(document_id, session_id, question, entry["answer"])
+        yield sse_event({"session_id": session.id, "answer": entry["answer"]}, event="done")
+
+    return event_stream_response(events())
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+# Search chunks across every processed document (corpus-wide HNSW index)
+@api_view(['POST'])
+def corpus_search(request):
+    query = request.data.get("query")
+    if not query or not str(query).strip():
+        return Response({"error": "Query cannot be empty"}, status=400)
+
+    try:
+        k = min(max(int(request.data.get("k", 10)), 1), 100)
+        ef_search = request.data.get("ef_search")
+        ef_search = min(max(int(ef_search), 1), 1024) if ef_search is not None else None
+        document_ids = request.data.get("document_ids")
+        document_ids = {int(doc_id) for doc_id in document_ids} if document_ids else None
+    except (TypeError, ValueError):
+        return Response({"error": "k, ef_search and document_ids must be integers"}, status=400)
+
+    try:
+        query_embedding = encode_texts([query])
+        hits = corpus_index.search(query_embedding, k=k, ef_search=ef_search, document_ids=document_ids)
+        logger.info(f"Corpus search returned {len(hits)} hits for: {query[:50]}...")
+        return Response({
+            "query": query,
+            "results": [
+                {
+                    "document_id": chunk.document_id,
+                    "document_title": chunk.document.title,
+                    "chunk_index": chunk.chunk_index,
+                    "page_number": chunk.page_number,
+                    "content": chunk.content,
+                    "distance": distance,
+                }
+                for chunk, distance in hits
+            ],
+        })
+    except Exception as e:
+        logger.error(f"Error in corpus search: {str(e)}")
+        return Response({"error": f"Search failed: {str(e)}"}, status=500)
+
 # Retrieve chat session details with messages
 class ChatSessionDetailView(RetrieveAPIView):
-    queryset = ChatSession.objects.all()
     serializer_class = ChatSessionSerializer
 
+    def get_queryset(self):
+        return chat_sessions_with_messages(ChatSession.objects.all(), messages_limit(self.request))
+
 # List chunks for a specific document
-class DocumentChunkListView(ListAPIView):
+# Same ?fields= / pagination / 304 support; e.g. ?fields=chunk_index,page_number skips the content
+class DocumentChunkListView(OptInCursorPaginationMixin, ConditionalListMixin, ListAPIView):
     serializer_class = DocumentChunkSerializer
+    pagination_class = ChunkCursorPagination
 
     def get_queryset(self):
         doc_id = self.kwargs.get("document_id")
-        return DocumentChunk.objects.filter(document_id=doc_id).order_by('chunk_index')
+        queryset = DocumentChunk.objects.filter(document_id=doc_id).order_by('chunk_index')
+        fields = projected_fields(self.request, DocumentChunkSerializer)
+        if fields:
+            queryset = queryset.only(*fields, 'chunk_index')
+        return queryset
+
+    def get_list_version(self):
+        # Chunks only change when the document is (re)processed, which bumps its updated_at
+        updated_at = Document.objects.filter(pk=self.kwargs.get("document_id")).values_list('updated_at', flat=True).first()
+        return updated_at, ""
+
 
+def messages_limit(request):
+    # Optional ?messages_limit=N keeps only the newest N messages of each session
+    try:
+        limit = int(request.query_params.get('messages_limit', 0))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+def chat_sessions_with_messages(sessions, limit=None):
+    """
+    Annotates sessions with their message count and prefetches their messages, newest
+    first and capped at limit, so any number of sessions costs two queries.
+    """
+    messages = ChatMessage.objects.order_by('-created_at', '-id')
+    if limit:
+        messages = messages[:limit]  # Per-session slice, done by the database with a window function
+    return sessions.annotate(message_count=Count('messages')).prefetch_related(
+        Prefetch('messages', queryset=messages, to_attr='latest_messages')
+    )
 
 # Get chat history for a document
+# Sessions newest first. ?page_size / ?cursor switch to cursor pagination ({next, previous, results}).
 @api_view(['GET'])
 def chat_history(request, document_id):
     try:
-        sessions = ChatSession.objects.filter(document_id=document_id).order_by('-created_at')
-        data = []
-        for session in sessions:
-            messages_data = []
-            for msg in session.messages.all().order_by('created_at'):
-                messages_data.append({
-                    "question": msg.question,
-                    "answer": msg.answer,
-                    "created_at": msg.created_at
-                })
-            
-            data.append({
-                "session_id": session.id,
-                "created_at": session.created_at,
-                "messages": messages_data
-            })
-        
+        sessions = chat_sessions_with_messages(
+            ChatSession.objects.filter(document_id=document_id).order_by('-created_at', '-id'),
+            messages_limit(request),
+        )
+        if pagination_requested(request):
+            paginator = ChatSessionCursorPagination()
+            page = paginator.paginate_queryset(sessions, request)
+            logger.info(f"Retrieved {len(page)} chat sessions for document {document_id}")
+            return paginator.get_paginated_response(ChatHistorySessionSerializer(page, many=True).data)
+
+        data = ChatHistorySessionSerializer(sessions, many=True).data
         logger.info(f"Retrieved {len(data)} chat sessions for document {document_id}")
         return Response(data)
     except Exception as e:
         logger.error(f"Error retrieving chat history for document {document_id}: {str(e)}")
         return Response({"error": f"Error retrieving chat history: {str(e)}"}, status=500)
 
-@functools.lru_cache(maxsize=None)
-def load_risk_knowledge_base():
-    """
-    Parses your risks.md file into a list of risk objects.
-    This is cached, so it only runs once.
-    """
-    logger.info("--- [Risk DB] Loading knowledge base... ---")
-    risks = []
-    
-    file_path = str(settings.BASE_DIR / 'risks.md') 
-    
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        risk_blocks = re.split(r'\n# Risk:\s*', content)
-        
-        for block in risk_blocks:
-            if not block.strip():
-                continue
-            
-            lines = block.strip().split('\n')
-            risk_name = lines[0].strip()
-            
-            risk_obj = {"name": risk_name}
-            
-            for line in lines[1:]:
-                if line.startswith('- **Description:**'):
-                    risk_obj['description'] = line.split('**', 2)[-1].strip()
-                elif line.startswith('- **Why it\'s harmful:**'):
-                    risk_obj['harmful'] = line.split('**', 2)[-1].strip()
-                elif line.startswith('- **Keywords to find:**'):
-                    # This captures the keyword string, e.g., '"kw1," "kw2"'
-                    risk_obj['keywords'] = line.split('**', 2)[-1].strip()
-            
-            if 'name' in risk_obj and 'description' in risk_obj:
-                risks.append(risk_obj)
-                
-    except FileNotFoundError:
-        logger.error(f"--- [ERROR] risks.md not found at {file_path} ---")
-        return []
-    except Exception as e:
-        logger.error(f"--- [ERROR] Failed to parse risks.md: {e} ---")
-        return []
-
-    logger.info(f"--- [Risk DB] Loaded {len(risks)} risks. ---")
-    return risks
-
 # -----------------------------------------------------------------
 #  THE "ENGINE": YOUR NEW "INTERCEPTOR" API ENDPOINT
 # -----------------------------------------------------------------
@@ -359,6 +544,9 @@ def analyze_document_risks(request):
         loan_text = request.data.get('text')
         if not loan_text:
             return JsonResponse({'error': 'No text provided'}, status=400)
+        mode = request.data.get('mode') or RISK_ANALYSIS_MODE
+        if mode not in ANALYSIS_MODES:
+            return JsonResponse({'error': f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Invalid request body: {str(e)}'}, status=400)
 
@@ -366,92 +554,13 @@ def analyze_document_risks(request):
     if len(loan_text) < 50: # Arbitrary small length
         logger.warning(f"--- [WARN] Text too short to analyze ({len(loan_text)} chars). Skipping analysis. ---")
         # Return an empty report
-        risks = load_risk_knowledge_base()
-        final_report = []
-        for risk in risks:
-            final_report.append({"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": "Text too short."})
-        return JsonResponse({'report': final_report})
+        return JsonResponse({'report': short_text_report(load_risk_knowledge_base())})
     
-    loan_text_lower = loan_text.lower() # Pre-calculate for efficiency
-    risks = load_risk_knowledge_base()
-    if not risks:
+    if not load_risk_knowledge_base():
         return JsonResponse({'error': 'Risk knowledge base is empty or failed to load.'}, status=500)
 
-    final_report = []
-
-    for risk in risks:
-        try:
-            # --- [THE BUG FIX IS HERE] ---
-            keyword_string = risk.get('keywords', '""') # Get the string: '"kw1", "kw2"'
-            # Robust parser: remove quotes, split by comma, strip whitespace
-            keywords_list = [k.strip().lower() for k in keyword_string.replace('"', '').split(',') if k.strip()]
-            # --- [END BUG FIX] ---
-            
-            found_keyword = False
-            for kw in keywords_list:
-                if not kw: continue # Skip empty strings
-                if loan_text_lower.find(kw) != -1: # Already lowercase
-                    found_keyword = True
-                    logger.info(f"--- [Interceptor] Keyword '{kw}' found for risk: {risk['name']}. Sending to LLM. ---")
-                    break # Found one, no need to check others
-            
-            if not found_keyword:
-                logger.info(f"--- [Interceptor] No keywords found for {risk['name']}. Skipping LLM call. ---")
-                final_report.append({"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": ""})
-                continue # Skip to the next risk
-            
-            # --- IF WE ARE HERE, A KEYWORD WAS FOUND. NOW WE VERIFY WITH THE LLM. ---
-            
-            prompt = f"""
-You are a senior loan analysis expert. Your task is to find one specific risk in the provided loan agreement.
-You MUST respond in a valid JSON format.
-
-**The Risk to Find:** {risk['name']}
-**Definition:** {risk.get('description', 'N/A')}
-
-**The Loan Agreement (Excerpt with potential keywords):**
----
-{loan_text}
----
-
-**Your Task:**
-Carefully read the agreement. Confirm if the risk defined above is truly present. Respond using the following JSON structure.
-- If the risk **IS FOUND**: set "found" to true, "clause_text" to the EXACT quote, and "analysis" to your brief analysis.
-- If the risk **IS NOT FOUND** (e.g., the keyword is used in a safe context): set "found" to false, "clause_text" to an empty string (""), and "analysis" to an empty string ("").
-
-**JSON Response Template (DO NOT ADD ANY TEXT OUTSIDE THE BRACES):**
-{{
-  "found": <true_or_false>,
-  "risk_name": "{risk['name']}",
-  "clause_text": "<quote_or_empty_string>",
-  "analysis": "<analysis_or_empty_string>"
-}}
-"""
-            response_text = call_local_llm(prompt)
-            match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not match:
-                raise json.JSONDecodeError("No JSON object found in LLM response", response_text, 0)
-            
-            json_string = match.group(0)
-            result_json = json.loads(json_string)
-            
-            # Logical Check
-            if result_json.get("found") == True and not result_json.get("clause_text"):
-                logger.warning(f"--- [WARN] False positive detected for {risk['name']}. Overriding to 'false'. ---")
-                result_json["found"] = False
-                result_json["analysis"] = ""
-
-            final_report.append(result_json)
-
-        except json.JSONDecodeError:
-            logger.error(f"--- [ERROR] LLM returned invalid JSON for risk: {risk['name']} ---")
-            logger.error(f"Raw Response was: {response_text}")
-            final_report.append({"found": False, "risk_name": risk['name'], "error": "AI response was not valid JSON."})
-        except Exception as e:
-            logger.error(f"--- [ERROR] Local LLM call failed for risk {risk['name']}: {e} ---")
-            final_report.append({"found": False, "risk_name": risk['name'], "error": str(e)})
-
-    return JsonResponse({'report': final_report})
+    final_report, prompt_stats = analyze_loan_text(loan_text, log_tag="Interceptor", mode=mode, use_cache=request_flag(request, 'use_cache'))
+    return JsonResponse({'report': final_report, 'prompt_stats': prompt_stats})
 
 
 # THIS IS YOUR *PRODUCTION* ENDPOINT (TAKES DOCUMENT ID)
@@ -460,106 +569,100 @@ def analyze_risk_by_id(request, document_id):
     """
     Runs the Risk Interceptor on a pre-uploaded document using its ID.
     """
+    mode = request.data.get('mode') or RISK_ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        return JsonResponse({'error': f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=400)
+
     try:
         document = get_object_or_404(Document, pk=document_id)
         
         if not document.file or not document.file.path:
             return JsonResponse({'error': 'File not found for this document.'}, status=404)
         
-        logger.info(f"--- [Interceptor] Extracting text from: {document.file.path} ---")
-        loan_text = extract_text(document)
+        # Stored at ingestion; only documents processed before that are parsed (once) here
+        loan_text = get_document_text(document)
         if not loan_text:
             return JsonResponse({'error': 'Could not extract text from file.'}, status=500)
         
         # --- [NEW] GUARDRAIL 1: Check for tiny text ---
         if len(loan_text) < 50:
             logger.warning(f"--- [WARN] Text too short to analyze ({len(loan_text)} chars). Skipping analysis. ---")
-            risks = load_risk_knowledge_base()
-            final_report = []
-            for risk in risks:
-                final_report.append({"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": "Text too short."})
-            return JsonResponse({'report': final_report})
-
-        loan_text_lower = loan_text.lower()
-        risks = load_risk_knowledge_base()
-        if not risks:
-            return JsonResponse({'error': 'Risk knowledge base is empty.'}, status=500)
+            return JsonResponse({'report': short_text_report(load_risk_knowledge_base())})
 
-        final_report = []
+        if not load_risk_knowledge_base():
+            return JsonResponse({'error': 'Risk knowledge base is empty.'}, status=500)
 
-        for risk in risks:
-            try:
-                # --- [THE BUG FIX IS HERE] ---
-                keyword_string = risk.get('keywords', '""') # Get the string: '"kw1", "kw2"'
-                # Robust parser: remove quotes, split by comma, strip whitespace
-                keywords_list = [k.strip().lower() for k in keyword_string.replace('"', '').split(',') if k.strip()]
-                # --- [END BUG FIX] ---
-                
-                found_keyword = False
-                for kw in keywords_list:
-                    if not kw: continue
-                    if loan_text_lower.find(kw) != -1: # Already lowercase
-                        found_keyword = True
-                        logger.info(f"--- [Interceptor ID] Keyword '{kw}' found for risk: {risk['name']}. Sending to LLM. ---")
-                        break
-                
-                if not found_keyword:
-                    logger.info(f"--- [Interceptor ID] No keywords found for {risk['name']}. Skipping LLM call. ---")
-                    final_report.append({"found": False, "risk_name": risk['name'], "clause_text": "", "analysis": ""})
-                    continue 
-                
-                # --- IF WE ARE HERE, A KEYWORD WAS FOUND. NOW WE VERIFY WITH THE LLM. ---
-                
-                prompt = f"""
-You are a senior loan analysis expert. Your task is to find one specific risk in the provided loan agreement.
-You MUST respond in a valid JSON format.
-
-**The Risk to Find:** {risk['name']}
-**Definition:** {risk.get('description', 'N/A')}
-
-**The Loan Agreement (Excerpt with potential keywords):**
----
-{loan_text}
----
-
-**Your Task:**
-Carefully read the agreement. Confirm if the risk defined above is truly present. Respond using the following JSON structure.
-- If the risk **IS FOUND**: set "found" to true, "clause_text" to the EXACT quote, and "analysis" to your brief analysis.
-- If the risk **IS NOT FOUND** (e.g., the keyword is used in a safe context): set "found" to false, "clause_text" to an empty string (""), and "analysis" to an empty string ("").
-
-**JSON Response Template (DO NOT ADD ANY TEXT OUTSIDE THE BRACES):**
-{{
-  "found": <true_or_false>,
-  "risk_name": "{risk['name']}",
-  "clause_text": "<quote_or_empty_string>",
-  "analysis": "<analysis_or_empty_string>"
-}}
-"""
-                response_text = call_local_llm(prompt)
-                match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if not match:
-                    raise json.JSONDecodeError("No JSON object found in LLM response", response_text, 0)
-                
-                json_string = match.group(0)
-                result_json = json.loads(json_string)
-
-                if result_json.get("found") == True and not result_json.get("clause_text"):
-                    logger.warning(f"--- [WARN] False positive detected for {risk['name']}. Overriding to 'false'. ---")
-                    result_json["found"] = False
-                    result_json["analysis"] = ""
-                    result_json["clause_text"] = ""
-
-                final_report.append(result_json)
-
-            except Exception as e:
-                logger.error(f"--- [ERROR] Local LLM call failed for risk {risk['name']}: {e} ---")
-                final_report.append({"found": False, "risk_name": risk['name'], "error": str(e)})
-
-        return JsonResponse({'report': final_report})
+        # Only risks whose stored verdict is stale are sent to the LLM
+        final_report, prompt_stats = get_risk_report(document, loan_text, mode, use_cache=request_flag(request, 'use_cache'))
+        return JsonResponse({'report': final_report, 'prompt_stats': prompt_stats})
 
     except Document.DoesNotExist:
         return JsonResponse({'error': 'Document not found.'}, status=404)
     except Exception as e:
         logger.error(f"--- [ERROR] Failed to analyze risk by ID: {e} ---")
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
-# --- [NEW FUNCTION END] ---
\ No newline at end of file
+# --- [NEW FUNCTION END] ---
+
+
+# -----------------------------------------------------------------
+#  BATCH RISK SCANS (PORTFOLIO)
+# -----------------------------------------------------------------
+def risk_scan_response(job, include_items=False, status_code=200):
+    data = RiskScanJobSerializer(job).data
+    data.update(scan_summary(job))
+    if include_items:
+        items = job.items.select_related('document').order_by('id')
+        data['items'] = RiskScanItemSerializer(items, many=True).data
+    return Response(data, status=status_code)
+
+# Start a scan over a list of document ids, or "all" processed documents
+@api_view(['GET', 'POST'])
+def risk_scans(request):
+    if request.method == 'GET':
+        jobs = RiskScanJob.objects.order_by('-created_at')[:50]
+        return Response(RiskScanJobSerializer(jobs, many=True).data)
+
+    document_ids = request.data.get('document_ids')
+    if document_ids == 'all':
+        document_ids = None
+    elif not isinstance(document_ids, list) or not document_ids:
+        return Response({"error": 'document_ids must be a non-empty list of ids or "all"'}, status=400)
+    else:
+        try:
+            document_ids = [int(document_id) for document_id in document_ids]
+        except (TypeError, ValueError):
+            return Response({"error": "document_ids must be integers"}, status=400)
+
+    mode = request.data.get('mode') or RISK_ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        return Response({"error": f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=400)
+
+    job, missing_ids = create_scan(document_ids, mode)
+    if job.document_count:
+        risk_scan_runner.submit(job.id)
+    else:
+        job.status = 'completed'
+        job.save(update_fields=['status', 'updated_at'])
+    logger.info(f"--- [Risk Scan] Job {job.id} created for {job.document_count} documents ---")
+
+    response = risk_scan_response(job, status_code=status.HTTP_202_ACCEPTED)
+    response.data['missing_ids'] = missing_ids
+    return response
+
+# Progress, aggregated counts per risk and (with ?items=true) per-document results
+@api_view(['GET'])
+def risk_scan_detail(request, pk):
+    job = get_object_or_404(RiskScanJob, pk=pk)
+    return risk_scan_response(job, include_items=request_flag(request, 'items', default=False))
+
+# Re-queue a scan's interrupted and failed documents, e.g. after a crash or an LLM outage
+@api_view(['POST'])
+def resume_risk_scan(request, pk):
+    job = get_object_or_404(RiskScanJob, pk=pk)
+    if risk_scan_runner.is_running(job.id):
+        return Response({"error": "This scan is already running."}, status=409)
+    requeued = resume_scan(job, retry_failed=request_flag(request, 'retry_failed'))
+    risk_scan_runner.submit(job.id)
+    response = risk_scan_response(job, status_code=status.HTTP_202_ACCEPTED)
+    response.data['requeued'] = requeued
+    return response
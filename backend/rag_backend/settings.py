@@ -148,3 +148,90 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
+
+
+# RAG pipeline
+# Per-document embedding files and their manifest, reloaded after restarts
+VECTOR_STORE_DIR = BASE_DIR / 'vector_store'
+
+# Ingestion batch sizes
+EMBEDDING_BATCH_SIZE = 64  # Chunks encoded per model forward pass
+CHUNK_INSERT_BATCH_SIZE = 500  # DocumentChunk rows per bulk INSERT
+INGEST_WINDOW_SIZE = 256  # Chunks embedded, inserted and indexed together while streaming a document
+
+# Background ingestion queue (in-process; pending Document rows are the durable record)
+INGESTION_ASYNC = True  # Set False to process uploads inside the request
+INGESTION_WORKERS = 2  # Documents processed in parallel
+INGESTION_QUEUE_DEPTH = 20  # Uploads beyond this many queued/running documents get a 503
+
+# Parallel PDF extraction
+PDF_EXTRACTION_WORKERS = None  # Worker processes for page extraction; None uses one per CPU
+PDF_PAGES_PER_TASK = 8  # Pages handed to a worker at a time
+PDF_PARALLEL_MIN_PAGES = 16  # PDFs with fewer pages are extracted serially
+
+# Chunk embedding cache (normalized content hash -> vector), per process
+EMBEDDING_CACHE_SIZE = 20000  # ~1.5 KB per entry
+
+# Embedding model
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'  # Loaded lazily on first use
+EMBEDDING_WARM_UP = True  # Web workers load the model (or ping the embedding server) at startup
+# Set to a Unix socket path (e.g. '/tmp/rag-embeddings.sock') to share one model process
+# across all workers; start it with 'manage.py run_embedding_server'
+EMBEDDING_SERVER_SOCKET = None
+
+# Vector precision for the store and in-memory index: 'float32' (exact), 'float16' (half the
+# memory) or 'int8' (a quarter). Check the accuracy cost with 'manage.py check_vector_recall'.
+VECTOR_DTYPE = 'float32'
+
+# Corpus-wide ANN search (HNSW). Higher M / efConstruction improve recall at build cost;
+# efSearch is the per-query recall/latency knob and can be overridden per request.
+CORPUS_INDEX_PATH = VECTOR_STORE_DIR / 'corpus.hnsw'
+CORPUS_HNSW_M = 32
+CORPUS_HNSW_EF_CONSTRUCTION = 80
+CORPUS_HNSW_EF_SEARCH = 64
+CORPUS_INDEX_SAVE_EVERY = 50  # Documents added/removed (journaled) before the whole graph is rewritten
+
+# Hybrid retrieval for ask_question: vector + BM25 keyword candidates fused by rank
+RETRIEVAL_TOP_K = 4  # Chunks sent to the LLM
+RETRIEVAL_CANDIDATES = 20  # Candidates taken from each retriever before fusion
+BM25_MAX_DOCUMENTS = 500  # Keyword indexes kept in memory; older ones are rebuilt on demand
+
+# Risk Interceptor prompts: only the clauses around keyword hits are sent to the LLM
+RISK_PROMPT_TOKEN_BUDGET = 1500  # Max loan-text tokens per risk prompt (~4 chars per token)
+RISK_CLAUSE_MAX_CHARS = 400  # How far a clause window may extend either side of a keyword hit
+RISK_LLM_MAX_WORKERS = 4  # Risk verifications sent to the LLM concurrently (per process)
+RISK_LLM_TIMEOUT = 150  # Seconds one verification's LLM call may run (not counting time queued for a worker) before it is abandoned
+# 'per_risk' (one prompt per triggered risk) or 'combined' (one prompt for all of them);
+# requests can override it with "mode"
+RISK_ANALYSIS_MODE = 'per_risk'
+
+# Persistent cache of deterministic LLM responses (SQLite, shared by all workers on the host).
+# Requests can skip it with "use_cache": false; clear it with 'manage.py clear_llm_cache'.
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = BASE_DIR / 'llm_cache.sqlite3'
+LLM_CACHE_MAX_ENTRIES = 5000  # Least recently used responses are evicted beyond this
+LLM_CACHE_TTL = 7 * 24 * 3600  # Seconds; None keeps responses until evicted
+
+# Local LLM backends (OpenAI-compatible). List several in LOCAL_LLM_URLS to spread the load.
+LOCAL_LLM_MODEL = 'mistral-local'  # Model name sent to the backends (part of persisted risk verdicts' fingerprint)
+LOCAL_LLM_URL = 'http://localhost:1234/v1/chat/completions'
+LOCAL_LLM_URLS = [LOCAL_LLM_URL]
+LLM_CONNECT_TIMEOUT = 5  # Seconds to establish a connection
+LLM_READ_TIMEOUT = 120  # Seconds to wait for a completion
+LLM_MAX_RETRIES = 2  # Extra attempts on connection errors, connect timeouts and 429/5xx, with jittered backoff (read timeouts are not retried)
+LLM_RETRY_BACKOFF = 0.5  # Base backoff in seconds, doubled per attempt
+LLM_POOL_SIZE = 10  # Keep-alive connections per backend; at least RISK_LLM_MAX_WORKERS
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures before a backend is skipped
+LLM_CIRCUIT_RESET_TIMEOUT = 30  # Seconds before a skipped backend is tried again
+
+# Batch risk scans (risk-scans/). Interrupted scans resume with 'manage.py resume_risk_scans'.
+RISK_SCAN_WORKERS = 2  # Documents scanned in parallel
+RISK_SCAN_DOCUMENTS_PER_MINUTE = 30  # Throughput cap on document starts; 0 disables it
+
+# Semantic answer cache: a question within ANSWER_CACHE_THRESHOLD cosine similarity of one
+# already answered for the same document reuses that answer (per process, in memory).
+# Requests can skip it with "use_cache": false; re-processing or deleting a document invalidates it.
+ANSWER_CACHE_THRESHOLD = 0.92  # Lower reuses more answers, at the risk of answering a different question
+ANSWER_CACHE_MAX_PER_DOCUMENT = 50  # Least recently used answers of a document are evicted beyond this
+ANSWER_CACHE_MAX_DOCUMENTS = 500  # Least recently asked documents are evicted beyond this
+ANSWER_CACHE_TTL = 24 * 3600  # Seconds; None keeps answers until evicted or invalidated
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_backend.settings')
 
 application = get_wsgi_application()
+
+# Load the embedding model before the first request instead of during it
+from django.conf import settings  # noqa: E402
+if getattr(settings, 'EMBEDDING_WARM_UP', False):
+    from core.embeddings import warm_up  # noqa: E402
+    warm_up()
@@ -21,6 +21,8 @@ export default function Upload() {
   };
 
   const maxFileSize = 10 * 1024 * 1024;
+  const pollInterval = 1500;
+  const maxProcessingWait = 10 * 60 * 1000;
 
   const validateFile = (file) => {
     if (!file) return { valid: false, error: 'No file selected' };
@@ -48,6 +50,25 @@ export default function Upload() {
     setUploadSuccess(false);
   };
 
+  // Uploads are processed in the background; poll until the document is ready to chat with
+  // Gives up after maxProcessingWait (e.g. the document is stuck pending behind a busy queue)
+  const waitForProcessing = async (id) => {
+    const deadline = Date.now() + maxProcessingWait;
+    while (Date.now() < deadline) {
+      const { data } = await axios.get(`http://localhost:8000/api/documents/${id}/status/`);
+      if (data.processing_status === 'processed') return;
+      if (data.processing_status === 'failed') {
+        const failure = new Error(data.processing_error || 'Document processing failed.');
+        failure.processingFailed = true;
+        throw failure;
+      }
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+    }
+    const timeout = new Error('Document processing is taking longer than expected. Please check back later from the documents list.');
+    timeout.processingFailed = true;
+    throw timeout;
+  };
+
   const handleFileUpload = async () => {
     if (!selectedFile) return;
 
@@ -71,14 +92,21 @@ export default function Upload() {
         },
       });
 
+      const { id } = response.data;
+      await waitForProcessing(id);
+
       setUploadSuccess(true);
       setTimeout(() => {
-        const { id } = response.data;
         navigate(`/chat?doc=${id}`);
       }, 1500);
     } catch (err) {
       console.error(err);
-      setError(err.response?.data?.message || 'Upload failed. Please verify your connection and try again.');
+      setError(
+        err.response?.data?.message ||
+        err.response?.data?.error ||
+        (err.processingFailed && err.message) ||
+        'Upload failed. Please verify your connection and try again.'
+      );
     } finally {
       setUploading(false);
     }